@@ -4,37 +4,67 @@ Email: chaitanyachadha12@gmail.com
 """
 
 import time
+import threading
 import subprocess
-from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from watcher import create_observer, emit, is_ignored, run_until_interrupted
 
 class TestRunHandler(FileSystemEventHandler):
-    def __init__(self, repo_path):
+    """
+    Coalesces bursts of filesystem events into a single test run.
+    Events only flag the tree as dirty; a background worker waits for the
+    burst to settle and then runs pytest once.
+    """
+
+    def __init__(self, repo_path, debounce: float = 0.3):
         self.repo_path = repo_path
+        self.debounce = debounce
+        self._dirty = threading.Event()
+        self._worker = threading.Thread(target=self._run_loop, daemon=True)
+        self._worker.start()
 
     def on_modified(self, event):
-        print("Change detected, running tests...")
+        if event.is_directory or not event.src_path.endswith('.py') or is_ignored(event.src_path):
+            return
+        self._dirty.set()
+
+    def _run_loop(self):
+        while True:
+            self._dirty.wait()
+            # Give the editor time to finish writing before clearing the flag,
+            # so every event of the same save collapses into this run.
+            time.sleep(self.debounce)
+            self._dirty.clear()
+            self._run_tests()
+
+    def _run_tests(self):
+        """Stream pytest output line by line; a newer change aborts the run so it restarts right away."""
+        emit("Change detected, running tests...")
         try:
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 ["pytest", "--maxfail=1", "--disable-warnings", "-q"],
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
+                bufsize=1,
                 cwd=self.repo_path
             )
-            print(result.stdout)
-            print(result.stderr)
         except Exception as e:
-            print(f"Error running tests: {e}")
+            emit(f"Error running tests: {e}")
+            return
+        # Leaving the with block closes the pipe and reaps the process.
+        with proc:
+            for line in proc.stdout:
+                emit(line.rstrip("\n"))
+                if self._dirty.is_set():
+                    proc.terminate()
+                    emit("New change detected, restarting tests...")
+                    break
 
-def watch_and_run_tests(repo_path):
+def watch_and_run_tests(repo_path, polling: bool = False):
     event_handler = TestRunHandler(repo_path)
-    observer = Observer()
+    observer = create_observer(polling)
     observer.schedule(event_handler, path=repo_path, recursive=True)
     observer.start()
     print(f"Autonomous test runner started for {repo_path}. Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+    run_until_interrupted(observer)
@@ -3,7 +3,42 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-import difflib
+import re
+from diff_utils import unified_diff
+
+_HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@')
+
+def iter_hunks(diff_lines):
+    """Yield each '@@' hunk of a unified diff as a list of lines, skipping the file headers."""
+    hunk = []
+    for line in diff_lines:
+        if line.startswith('@@'):
+            if hunk:
+                yield hunk
+            hunk = []
+        elif not hunk:
+            continue
+        hunk.append(line)
+    if hunk:
+        yield hunk
+
+def apply_hunks(original, hunks):
+    """
+    Apply the given unified-diff hunks to the original lines and return the result.
+    Hunks must come from a diff against these exact lines, in order.
+    """
+    result = []
+    position = 0
+    for hunk in hunks:
+        match = _HUNK_HEADER_RE.match(hunk[0])
+        start, length = int(match.group(1)), int(match.group(2) or 1)
+        # A zero-length range points at the line *before* the insertion.
+        start = start if length == 0 else start - 1
+        result.extend(original[position:start])
+        result.extend(line[1:] for line in hunk[1:] if line[:1] in (' ', '+'))
+        position = start + length
+    result.extend(original[position:])
+    return result
 
 def selective_apply(original_file: str, modified_file: str):
     with open(original_file, 'r', encoding='utf-8') as f:
@@ -11,38 +46,27 @@ def selective_apply(original_file: str, modified_file: str):
     with open(modified_file, 'r', encoding='utf-8') as f:
         modified = f.readlines()
 
-    diff = list(difflib.unified_diff(original, modified, fromfile="Original", tofile="Modified"))
-    if not diff:
-        print("No differences found.")
-        return
-
-    hunks = []
-    current_hunk = []
-    for line in diff:
-        if line.startswith('@@'):
-            if current_hunk:
-                hunks.append(current_hunk)
-                current_hunk = []
-        current_hunk.append(line)
-    if current_hunk:
-        hunks.append(current_hunk)
-
+    # Hunks are pulled from the diff generator one at a time instead of materializing the whole diff.
+    hunks = iter_hunks(unified_diff(original, modified, fromfile="Original", tofile="Modified", n=3))
+    found_any = False
+    approved = []
     for i, hunk in enumerate(hunks, start=1):
+        found_any = True
         print(f"\nHunk {i}:")
         print("".join(hunk))
         choice = input("Apply this hunk? (y/n): ")
         if choice.lower() == 'y':
-            # For simplicity, if at least one hunk is approved, we replace the file entirely.
+            approved.append(hunk)
             print("Hunk approved.")
         else:
             print("Hunk skipped.")
+    if not found_any:
+        print("No differences found.")
+        return
 
-    final_choice = input("Apply changes from modified file to original file? (y/n): ")
-    if final_choice.lower() == 'y':
-        with open(modified_file, 'r', encoding='utf-8') as f:
-            new_content = f.read()
-        with open(original_file, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        print("Selected changes applied.")
-    else:
+    if not approved:
         print("No changes applied.")
+        return
+    with open(original_file, 'w', encoding='utf-8') as f:
+        f.writelines(apply_hunks(original, approved))
+    print(f"Selected changes applied ({len(approved)} hunk(s)).")
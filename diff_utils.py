@@ -0,0 +1,107 @@
+"""
+Author: Chaitanya Chadha
+Email: chaitanyachadha12@gmail.com
+"""
+
+import difflib
+
+try:
+    from diff_match_patch import diff_match_patch
+except ImportError:
+    diff_match_patch = None
+
+# chr() can't encode more distinct lines than this.
+_MAX_UNIQUE_LINES = 0x110000
+
+def _lines_to_chars(a, b):
+    """Encode every distinct line as one character so diff_match_patch diffs whole lines."""
+    index = {}
+    if len(set(a).union(b)) > _MAX_UNIQUE_LINES:
+        return None
+    def encode(lines):
+        return "".join(chr(index.setdefault(line, len(index))) for line in lines)
+    return encode(a), encode(b)
+
+def _dmp_opcodes(a, b, timeout: float):
+    encoded = _lines_to_chars(a, b)
+    if encoded is None:
+        return None
+    dmp = diff_match_patch()
+    dmp.Diff_Timeout = timeout
+    diffs = dmp.diff_main(encoded[0], encoded[1], False)
+    dmp.diff_cleanupSemantic(diffs)
+    opcodes = []
+    i = j = 0
+    for op, text in diffs:
+        size = len(text)
+        if op == 0:
+            opcodes.append(('equal', i, i + size, j, j + size))
+            i += size
+            j += size
+        elif op == -1:
+            opcodes.append(('delete', i, i + size, j, j))
+            i += size
+        else:
+            opcodes.append(('insert', i, i, j, j + size))
+            j += size
+    return opcodes
+
+def _group_opcodes(opcodes, n: int):
+    """Same grouping as difflib.SequenceMatcher.get_grouped_opcodes."""
+    if not opcodes:
+        opcodes = [('equal', 0, 1, 0, 1)]
+    opcodes = list(opcodes)
+    if opcodes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[0]
+        opcodes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if opcodes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = opcodes[-1]
+        opcodes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    nn = n + n
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > nn:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+def unified_diff(a, b, fromfile: str = "", tofile: str = "", n: int = 3, lineterm: str = "\n", timeout: float = 1.0):
+    """
+    Drop-in replacement for difflib.unified_diff on lists of lines.
+    Uses diff_match_patch (Myers diff with a time budget) when it is installed,
+    which stays fast on large or highly repetitive files where difflib degrades.
+    """
+    opcodes = _dmp_opcodes(a, b, timeout) if diff_match_patch is not None else None
+    if opcodes is None:
+        yield from difflib.unified_diff(a, b, fromfile=fromfile, tofile=tofile, n=n, lineterm=lineterm)
+        return
+    started = False
+    for group in _group_opcodes(opcodes, n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}{lineterm}"
+            yield f"+++ {tofile}{lineterm}"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@{lineterm}"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            for line in a[i1:i2]:
+                yield '-' + line
+            for line in b[j1:j2]:
+                yield '+' + line
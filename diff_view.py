@@ -3,40 +3,66 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-import time
-import difflib
-from watchdog.observers import Observer
+import os
+import hashlib
 from watchdog.events import FileSystemEventHandler
+from diff_utils import unified_diff
+from watcher import create_observer, emit, run_until_interrupted
 
 class DiffHandler(FileSystemEventHandler):
     def __init__(self, file_path):
-        self.file_path = file_path
-        self.last_content = self._read_file()
+        self.file_path = os.path.abspath(file_path)
+        self._last_stat = None
+        self._last_hash = None
+        self._last_data = b""
+        snapshot = self._read_file()
+        if snapshot:
+            self._last_stat, self._last_hash, self._last_data = snapshot
+
+    def _stat_signature(self):
+        st = os.stat(self.file_path)
+        return (st.st_mtime_ns, st.st_size)
 
     def _read_file(self):
+        """Return (stat signature, content hash, raw bytes), or None if the file can't be read."""
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return f.readlines()
+            signature = self._stat_signature()
+            with open(self.file_path, 'rb') as f:
+                data = f.read()
         except Exception as e:
-            print(f"Error reading file: {e}")
-            return []
+            emit(f"Error reading file: {e}")
+            return None
+        return signature, hashlib.blake2b(data, digest_size=16).digest(), data
 
     def on_modified(self, event):
-        if event.src_path == self.file_path:
-            new_content = self._read_file()
-            diff = difflib.unified_diff(self.last_content, new_content, fromfile="Before", tofile="After")
-            print("\n".join(diff))
-            self.last_content = new_content
+        # A single path comparison is the whole filter; sibling and directory events never match.
+        if event.src_path != self.file_path:
+            return
+        # Editors emit spurious modified events; skip the read when size and mtime are unchanged.
+        try:
+            if self._stat_signature() == self._last_stat:
+                return
+        except OSError:
+            return
+        snapshot = self._read_file()
+        if not snapshot:
+            return
+        signature, content_hash, data = snapshot
+        self._last_stat = signature
+        if content_hash == self._last_hash:
+            return
+        before = self._last_data.decode('utf-8', errors='replace').splitlines(keepends=True)
+        after = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+        diff = unified_diff(before, after, fromfile="Before", tofile="After")
+        emit("\n".join(diff))
+        self._last_hash = content_hash
+        self._last_data = data
 
-def live_diff_view(file_path):
+def live_diff_view(file_path, polling: bool = False):
     event_handler = DiffHandler(file_path)
-    observer = Observer()
-    observer.schedule(event_handler, path=file_path, recursive=False)
+    observer = create_observer(polling)
+    # Watch only the file's own directory; events for siblings are dropped in on_modified.
+    observer.schedule(event_handler, path=os.path.dirname(event_handler.file_path), recursive=False)
     observer.start()
     print(f"Live diff view started for {file_path}. Press Ctrl+C to stop.")
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+    run_until_interrupted(observer)
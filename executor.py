@@ -3,24 +3,101 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-import subprocess
-import tempfile
 import os
+import atexit
+import queue
+import signal
+import threading
+import subprocess
 
-def run_in_sandbox(code: str, timeout: int = 5) -> str:
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False) as tmp_file:
-        tmp_file.write(code)
-        tmp_file_path = tmp_file.name
+def _spawn_worker() -> subprocess.Popen:
+    # -I skips user site-packages and PYTHON* env vars, -B keeps the child from writing .pyc files.
+    return subprocess.Popen(
+        ["python", "-I", "-B", "-"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=hasattr(os, "killpg")
+    )
+
+def _kill_worker(worker: subprocess.Popen):
     try:
-        result = subprocess.run(
-            ["python", tmp_file_path],
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        output = result.stdout + result.stderr
+        if hasattr(os, "killpg"):
+            os.killpg(worker.pid, signal.SIGKILL)
+        else:
+            worker.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def _run_worker(worker: subprocess.Popen, code: str, timeout: int) -> str:
+    """Feed code to a worker blocked on stdin and collect its output; the worker exits afterwards."""
+    try:
+        stdout, stderr = worker.communicate(input=code, timeout=timeout)
+        return stdout + stderr
     except subprocess.TimeoutExpired:
-        output = "Code execution timed out."
-    finally:
-        os.remove(tmp_file_path)
-    return output
+        _kill_worker(worker)
+        worker.communicate()
+        return "Code execution timed out."
+
+class SandboxPool:
+    """
+    Keeps interpreters started ahead of time so a snippet doesn't pay for Python startup.
+    Each worker is blocked reading its script from stdin; it runs exactly one snippet
+    and is then discarded, so no interpreter state leaks between runs. A replacement
+    is spawned as soon as a worker is checked out, which only pays off for long-lived
+    callers that run many snippets; one-shot callers should use run_in_sandbox without a pool.
+    """
+
+    def __init__(self, size: int = 4):
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(_spawn_worker())
+        atexit.register(self.close)
+
+    def _checkout(self) -> subprocess.Popen:
+        with self._lock:
+            worker = None
+            while not self._idle.empty():
+                candidate = self._idle.get_nowait()
+                if candidate.poll() is None:
+                    worker = candidate
+                    break
+            if worker is None:
+                worker = _spawn_worker()
+            if not self._closed:
+                self._idle.put(_spawn_worker())
+            return worker
+
+    def run(self, code: str, timeout: int = 5) -> str:
+        return _run_worker(self._checkout(), code, timeout)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            while not self._idle.empty():
+                worker = self._idle.get_nowait()
+                _kill_worker(worker)
+                worker.communicate()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_sandbox_pool(size: int = 1) -> SandboxPool:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(size=size)
+        return _pool
+
+def run_in_sandbox(code: str, timeout: int = 5, pool: SandboxPool = None) -> str:
+    """
+    Run code in a fresh interpreter. Without a pool exactly one interpreter is started, which is all
+    a one-shot command needs; long-lived callers running many snippets can pass get_sandbox_pool().
+    """
+    if pool is not None:
+        return pool.run(code, timeout=timeout)
+    return _run_worker(_spawn_worker(), code, timeout)
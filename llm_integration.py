@@ -3,8 +3,68 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-import requests
+import os
+import time
 import json
+import hashlib
+import sqlite3
+import requests
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+DEFAULT_CACHE_PATH = os.path.expanduser("~/.cache/refactron/llm_responses.sqlite3")
+
+class ResponseCache:
+    """
+    On-disk prompt -> response cache backed by sqlite, with a per-entry TTL.
+    A connection is opened (and closed) per operation so the cache can be shared by send_prompts' worker threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: int = 86400):
+        self.path = path
+        self.ttl = ttl
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with closing(self._connect()) as conn, conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, expires REAL)")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: LLM response cache disabled: {e}")
+            self.path = None
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str):
+        if not self.path:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute("SELECT response, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, response: str):
+        if not self.path:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, expires) VALUES (?, ?, ?)",
+                    (key, response, time.time() + self.ttl)
+                )
+        except sqlite3.Error:
+            pass
 
 class LLMIntegration:
     """
@@ -14,48 +74,164 @@ class LLMIntegration:
     - Ensure your local LLM server is running.
     """
 
-    def __init__(self, api_url: str = "http://localhost:11434", generate_endpoint: str = "/api/generate"):
+    def __init__(
+        self,
+        api_url: str = "http://localhost:11434",
+        generate_endpoint: str = "/api/generate",
+        model: str = "deepseek-r1:8b",
+        connect_timeout: float = 3.05,
+        request_timeout: float = 120,
+        max_output_tokens: int = 2048,
+        context_window: int = 8192,
+        max_retries: int = 3,
+        use_cache: bool = True
+    ):
         self.api_url = api_url
         self.generate_endpoint = generate_endpoint
+        self.model = model
+        self.connect_timeout = connect_timeout
+        # Read timeout between streamed chunks; generous enough for a cold model load.
+        self.request_timeout = request_timeout
+        self.max_output_tokens = max_output_tokens
+        self.context_window = context_window
+        # One pooled session per instance so repeated prompts reuse the same keep-alive connection.
+        self.session = requests.Session()
+        self.session.headers["Connection"] = "keep-alive"
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            max_retries=Retry(total=max_retries, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=frozenset({"POST"}))
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache = ResponseCache() if use_cache else None
+
+    def _generation_options(self, max_output_tokens: int = None) -> dict:
+        """Ollama options for one request; a larger output budget grows the context window by the same amount."""
+        num_predict = max_output_tokens or self.max_output_tokens
+        return {"num_predict": num_predict, "num_ctx": self.context_window + max(0, num_predict - self.max_output_tokens)}
+
+    def _cache_key(self, prompt: str, options: dict) -> str:
+        # Generation options change the output, so they are part of the key.
+        material = f"{self.model}\0{options['num_predict']}\0{options['num_ctx']}\0{prompt}"
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
 
-    def send_prompt(self, prompt: str) -> str:
+    def send_prompt(self, prompt: str, max_output_tokens: int = None, status: dict = None) -> str:
         """
         Send a prompt to the LLM and return its aggregated response.
-        If the response contains multiple JSON objects (one per line),
-        this method will concatenate the "response" values from all objects.
+        The endpoint streams one JSON object per line; each line is parsed as it
+        arrives and the "response" values are concatenated.
+        
+        Repeated prompts are answered from the on-disk cache without a network call.
+        Replies cut off at the output token limit are not cached.
         
         :param prompt: The prompt string to send.
+        :param max_output_tokens: Output budget for this prompt, instead of the instance default.
+        :param status: Optional dict that receives "done_reason" ("stop", "length", ...; None when cached).
         :return: A single aggregated response string from the LLM,
                  or an empty string if parsing fails.
         """
+        status = {} if status is None else status
+        options = self._generation_options(max_output_tokens)
+        key = self._cache_key(prompt, options) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                status["done_reason"] = None
+                return cached
+        response = self._generate(prompt, options, status)
+        if key is not None and response and status.get("done_reason") != "length":
+            self.cache.set(key, response)
+        return response
+
+    def send_prompt_stream(self, prompt: str) -> Iterator[str]:
+        """
+        Send a prompt to the LLM and yield response text as it arrives.
+        A cached response is yielded in one piece; a fresh one is cached once fully received.
+
+        :param prompt: The prompt string to send.
+        :return: An iterator over response fragments (nothing if the request fails).
+        """
+        options = self._generation_options()
+        key = self._cache_key(prompt, options) if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts = []
+        status = {}
+        for part in self._stream(prompt, options, status):
+            parts.append(part)
+            yield part
+        response = "".join(parts).strip()
+        # A stream cut off mid-reply has already been shown, but must not be served again from the cache.
+        if key is not None and response and status["complete"] and status.get("done_reason") != "length":
+            self.cache.set(key, response)
+
+    def _generate(self, prompt: str, options: dict, status: dict) -> str:
+        """Return the full response, or "" if the stream failed or ended before the model was done."""
+        response = "".join(self._stream(prompt, options, status)).strip()
+        return response if status["complete"] else ""
+
+    def _stream(self, prompt: str, options: dict, status: dict) -> Iterator[str]:
+        """
+        Yield response fragments as they arrive. status["complete"] is set to True only once
+        the final "done" line has been received, along with its status["done_reason"];
+        a dropped connection or timeout leaves it False.
+        """
+        status["complete"] = False
+        status["done_reason"] = None
         try:
-            payload = {"prompt": prompt, "model": "deepseek-r1:8b"}
-            response = requests.post(self.api_url + self.generate_endpoint, json=payload, timeout=10)
-            response.raise_for_status()  # Raise an exception for HTTP errors.
-            try:
-                # First, try to parse the entire response as a single JSON object.
-                data = response.json()
-                return data.get("response", "")
-            except json.JSONDecodeError:
-                # If that fails, try to parse the response line by line.
-                raw_text = response.text.strip()
-                lines = raw_text.splitlines()
-                accumulated_response = ""
-                for line in lines:
+            payload = {
+                "prompt": prompt,
+                "model": self.model,
+                "stream": True,
+                "options": options
+            }
+            url = self.api_url + self.generate_endpoint
+            with self.session.post(url, json=payload, stream=True, timeout=(self.connect_timeout, self.request_timeout)) as response:
+                response.raise_for_status()  # Raise an exception for HTTP errors.
+                parsed_any = False
+                for line in response.iter_lines():
+                    if not line:
+                        continue
                     try:
-                        data = json.loads(line)
-                        if "response" in data:
-                            accumulated_response += data.get("response", "")
+                        # Lines are parsed straight from bytes; orjson.JSONDecodeError subclasses json's.
+                        data = json_loads(line)
                     except json.JSONDecodeError:
                         continue
-                if accumulated_response:
-                    return accumulated_response.strip()
-                else:
-                    print("Error: Unable to parse response as JSON.")
-                    return ""
+                    parsed_any = True
+                    part = data.get("response", "")
+                    if part:
+                        yield part
+                    if data.get("done"):
+                        status["complete"] = True
+                        status["done_reason"] = data.get("done_reason")
+                        break
+            if not parsed_any:
+                print("Error: Unable to parse response as JSON.")
+            elif not status["complete"]:
+                print("Error: LLM response ended before it was complete.")
         except requests.exceptions.Timeout:
             print("Error: Request to LLM timed out.")
-            return ""
         except requests.exceptions.RequestException as e:
             print(f"Error: Request to LLM failed: {e}")
-            return ""
+
+    def send_prompts(self, prompts: List[str], max_concurrency: int = 8, max_output_tokens: int = None, statuses: List[dict] = None) -> List[str]:
+        """
+        Send several independent prompts concurrently over the pooled session.
+        Ollama schedules concurrent requests on the same loaded model, so this is
+        much faster than sending them one after another.
+
+        :param prompts: The prompt strings to send.
+        :param max_concurrency: Upper bound on in-flight requests (kept below the pool size).
+        :param max_output_tokens: Output budget for each prompt, as in send_prompt.
+        :param statuses: Optional list of dicts, one per prompt, filled as by send_prompt.
+        :return: The responses, in the same order as the prompts.
+        """
+        if not prompts:
+            return []
+        statuses = statuses if statuses is not None else [{} for _ in prompts]
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(prompts))) as executor:
+            return list(executor.map(lambda prompt, status: self.send_prompt(prompt, max_output_tokens, status), prompts, statuses))
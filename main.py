@@ -7,52 +7,217 @@ import os
 import sys
 import re
 import json
-import time
+import atexit
+import filecmp
+import functools
+import io
+import itertools
+import mmap
+import shutil
 import threading
 import subprocess
+import tempfile
+import tokenize
 import typer
-from repository_manager import RepositoryManager
-from prompt_engineering import PromptEngineer
-from llm_integration import LLMIntegration
-from tool_integration import ToolIntegration
-from test_generator import generate_test_file, generate_custom_test_file
-from diff_view import live_diff_view
-from autotest import watch_and_run_tests
-from executor import run_in_sandbox
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 app = typer.Typer()
 CONFIG_FILE = os.path.expanduser("~/.ai_coding_agent_config.json")
+SYNTAX_CACHE_FILE = os.path.expanduser("~/.refactron_syntax_cache.json")
+LINT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+FIX_CONCURRENCY = 4
+FIX_ECHO_BATCH = 16
+_PLUGIN_URL_RE = re.compile(r'^(https?://[^\s/$.?#].[^\s]*)\.git$')
+_FAILED_TEST_RE = re.compile(r'test_[\w_]+\.py')
+
+def json_loads(data: bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes with orjson when available; indent uses two spaces either way."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+def make_temp_beside(path: str):
+    """Create a uniquely named hidden temp file in path's directory; returns (fd, temp_path) like mkstemp."""
+    return tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix="." + os.path.basename(path) + ".",
+        suffix=".tmp",
+    )
+
+def write_file_atomic(path: str, data: bytes):
+    """
+    Write data to a fresh temp file beside path and rename it over path, so readers
+    never see a half-written file and concurrent writers never share a temp file.
+    An existing file's permissions are kept.
+    """
+    fd, tmp_file = make_temp_beside(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_file)
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
 
 def save_repo_path(repo_path: str):
-    """Save the repository path in a configuration file."""
+    """Save the repository path in a configuration file (write-then-rename, so a crash can't corrupt it)."""
     try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump({"repo_path": repo_path}, f)
+        write_file_atomic(CONFIG_FILE, json_dumps({"repo_path": repo_path}))
     except Exception as e:
         typer.echo(f"Error saving repository path: {e}")
+    finally:
+        load_repo_path.cache_clear()
 
+@functools.lru_cache(maxsize=1)
 def load_repo_path() -> str:
-    """Load the repository path from the configuration file."""
+    """Load the repository path from the configuration file. Parsed once per process."""
     try:
-        with open(CONFIG_FILE, "r") as f:
-            config = json.load(f)
+        with open(CONFIG_FILE, "rb") as f:
+            config = json_loads(f.read())
             return config.get("repo_path", "")
     except Exception as e:
         typer.echo(f"Error loading repository configuration: {e}")
         return ""
 
-def resolve_path(path: str, full: bool) -> str:
+def resolve_path(path: str, full: bool, repo_path: str = None) -> str:
     """
     Resolve a given file/directory path. If 'full' is False, join it with the repo path.
+    Callers that already loaded the repo path can pass it in to skip the lookup.
     """
     if full:
         return path
-    repo_path = load_repo_path()
+    repo_path = repo_path or load_repo_path()
     if not repo_path:
         typer.echo("Repository not initialized. Run 'init-repo' first.")
         raise typer.Exit(code=1)
     return os.path.join(repo_path, path)
 
+def read_text_file(path: str) -> str:
+    """
+    Read a UTF-8 text file with a single read() sized from fstat, instead of going
+    through a buffered TextIOWrapper. Newlines are normalized like text-mode open().
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size + 1)
+        if len(data) > size:
+            # The file grew, or reports size 0 (like /proc): read the rest until EOF.
+            chunks = [data]
+            while chunks[-1]:
+                chunks.append(os.read(fd, 1 << 16))
+            data = b"".join(chunks)
+    finally:
+        os.close(fd)
+    return decode_text(data)
+
+def decode_text(data: bytes) -> str:
+    """Decode UTF-8 and normalize newlines like text-mode open()."""
+    text = data.decode("utf-8")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+def decode_source(data: bytes) -> str:
+    """Decode Python source using its coding cookie or BOM, falling back to UTF-8 with replacement characters."""
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+        text = data.decode(encoding)
+    except (SyntaxError, UnicodeDecodeError):
+        text = data.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+@functools.lru_cache(maxsize=32)
+def _read_text_lines_cached(path: str, mtime_ns: int, size: int) -> tuple:
+    with open(path, "r", encoding="utf-8", buffering=1 << 16) as f:
+        return tuple(f.readlines())
+
+def read_text_lines(path: str) -> list:
+    """
+    Read a UTF-8 text file as a list of lines through a 64 KiB buffer, for diffing.
+    The last few files are cached on (path, mtime_ns, size), so apply_changes
+    after preview in the same process doesn't read the files again.
+    """
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    return list(_read_text_lines_cached(key, st.st_mtime_ns, st.st_size))
+
+def files_identical(path_a: str, path_b: str) -> bool:
+    """Byte-compare two files; sizes are checked first, so differing files usually cost one stat each."""
+    return filecmp.cmp(path_a, path_b, shallow=False)
+
+def replace_file_with(src: str, dst: str):
+    """
+    Overwrite dst with the contents of src without ever leaving dst half-written.
+    Symlinks are followed so the link itself survives; the copy goes to a temp file
+    next to the real file (shutil uses copy_file_range/sendfile on Linux), takes over
+    its permissions and owner, and is renamed over it.
+    """
+    dst = os.path.realpath(dst)
+    fd, tmp_file = make_temp_beside(dst)
+    os.close(fd)
+    try:
+        shutil.copyfile(src, tmp_file)
+        shutil.copymode(dst, tmp_file)
+        st = os.stat(dst)
+        try:
+            os.chown(tmp_file, st.st_uid, st.st_gid)
+        except (AttributeError, PermissionError):
+            pass
+        os.replace(tmp_file, dst)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+#####################################
+# Shared per-invocation state
+#####################################
+class AppState:
+    """
+    Holds helpers shared by the commands of one invocation (stored on ctx.obj).
+    Each helper is imported and constructed on first use only.
+    """
+
+    def __init__(self):
+        self._tools = None
+        self._llm = None
+        self._repos = {}
+
+    @property
+    def tools(self):
+        if self._tools is None:
+            from tool_integration import ToolIntegration
+            self._tools = ToolIntegration()
+        return self._tools
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from llm_integration import LLMIntegration
+            self._llm = LLMIntegration()
+        return self._llm
+
+    def repo(self, repo_path: str):
+        """Return a loaded RepositoryManager for repo_path, or None if it isn't a valid repository."""
+        if repo_path not in self._repos:
+            from repository_manager import RepositoryManager
+            repo_manager = RepositoryManager(repo_path)
+            self._repos[repo_path] = repo_manager if repo_manager.load_repository() else None
+        return self._repos[repo_path]
+
 #####################################
 # LLM Thinking Indicator
 #####################################
@@ -61,117 +226,210 @@ def thinking_indicator(stop_event: threading.Event):
     while not stop_event.is_set():
         sys.stdout.write("\rThinking...   ")
         sys.stdout.flush()
-        for _ in range(10):
-            if stop_event.is_set():
-                break
-            time.sleep(1)
+        if stop_event.wait(timeout=10):
+            break
     sys.stdout.write("\r" + " " * 20 + "\r")
     sys.stdout.flush()
 
 #####################################
 # Utility: Fix a single file for syntax errors
 #####################################
-def fix_file(file_path: str, auto_apply: bool = False):
+class SyntaxCache:
+    """
+    Remembers files that compiled cleanly, keyed by absolute path -> (mtime_ns, size),
+    so repeat scans skip reading and compiling files that haven't changed.
+    Loaded on first use and written back once at exit.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = None
+        self._dirty = False
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                with open(self.path, "rb") as f:
+                    self._entries = json_loads(f.read())
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def is_clean(self, file_path: str, st: os.stat_result) -> bool:
+        return self._load().get(file_path) == [st.st_mtime_ns, st.st_size]
+
+    def mark_clean(self, file_path: str, st: os.stat_result):
+        self._load()[file_path] = [st.st_mtime_ns, st.st_size]
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            write_file_atomic(self.path, json_dumps(self._entries))
+            self._dirty = False
+        except OSError:
+            pass
+
+syntax_cache = SyntaxCache(SYNTAX_CACHE_FILE)
+atexit.register(syntax_cache.save)
+
+def find_syntax_error(file_path: str):
+    """Return (content, SyntaxError) if the file fails to compile, otherwise None."""
+    cache_key = os.path.abspath(file_path)
+    st = os.stat(file_path)
+    if syntax_cache.is_clean(cache_key, st):
+        return None
+    # compile() reads the mapped pages directly; the source is only decoded to str when it has an error.
+    with open(file_path, "rb") as f:
+        if st.st_size:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            source = b""
+        try:
+            compile(source, file_path, 'exec')
+        except SyntaxError as e:
+            return decode_source(source[:]), e
+        finally:
+            if isinstance(source, mmap.mmap):
+                source.close()
+    syntax_cache.mark_clean(cache_key, st)
+    return None
+
+def build_fix_prompt(content: str, error: SyntaxError) -> str:
+    return (
+        f"The following file has a syntax error:\n\n{content}\n\n"
+        f"The error message is: {error}\n\n"
+        "Please provide a fixed version of the file. Provide only the modified file content."
+    )
+
+def offer_fix(file_path: str, fix: str, auto_apply: bool = False) -> bool:
+    """Show an LLM-proposed fix and write it if confirmed (or auto_apply). Returns True if applied."""
+    if not fix:
+        typer.echo("LLM did not return a fix.")
+        return False
+    typer.echo("Proposed fix:")
+    typer.echo(fix)
+    if auto_apply or typer.confirm("Apply this fix to the file?"):
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(fix)
+        typer.echo(f"Fix applied to {file_path}.")
+        return True
+    typer.echo("Fix not applied.")
+    return False
+
+def fix_file(file_path: str, auto_apply: bool = False, llm=None):
     """
     Scan a file for syntax errors. If found, use the LLM to generate a fix.
     If auto_apply is False, prompt the user to apply the fix.
+    Pass llm to reuse one client (and its connection pool) across many files.
     Returns True if a fix was applied, False otherwise.
     """
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        # Try compiling the file
-        compile(content, file_path, 'exec')
+    found = find_syntax_error(file_path)
+    if found is None:
         typer.echo(f"No syntax errors in {file_path}.")
         return False
-    except SyntaxError as e:
-        typer.echo(f"Syntax error in {file_path}: {e}")
+    content, e = found
+    typer.echo(f"Syntax error in {file_path}: {e}")
+    if llm is None:
+        from llm_integration import LLMIntegration
         llm = LLMIntegration()
-        prompt = (
-            f"The following file has a syntax error:\n\n{content}\n\n"
-            f"The error message is: {e}\n\n"
-            "Please provide a fixed version of the file. Provide only the modified file content."
-        )
-        fix = llm.send_prompt(prompt)
-        if fix:
-            typer.echo("Proposed fix:")
-            typer.echo(fix)
-            if auto_apply or typer.confirm("Apply this fix to the file?"):
-                with open(file_path, "w", encoding="utf-8") as f:
-                    f.write(fix)
-                typer.echo(f"Fix applied to {file_path}.")
-                return True
-            else:
-                typer.echo("Fix not applied.")
-                return False
-        else:
-            typer.echo("LLM did not return a fix.")
-            return False
+    return offer_fix(file_path, llm.send_prompt(build_fix_prompt(content, e)), auto_apply)
+
+def _iter_py_files(root: str):
+    """Yield .py files under root via os.scandir, never descending into 'tests' directories."""
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            if entry.name != "tests":
+                yield from _iter_py_files(entry.path)
+        elif entry.name.endswith(".py"):
+            yield entry.path
+
+def collect_python_files(repo_path: str) -> list:
+    """List every .py file under repo_path, skipping anything under a 'tests' directory."""
+    return list(_iter_py_files(repo_path))
 
 #####################################
 # Commands
 #####################################
 
+@app.callback()
+def main_callback(ctx: typer.Context):
+    ctx.obj = AppState()
+
 @app.command("init-repo", help="Initialize and load the Git repository.\nExample: python main.py init-repo /path/to/repo")
-def init_repo(repo_path: str):
-    repo_manager = RepositoryManager(repo_path)
-    if repo_manager.load_repository():
+def init_repo(ctx: typer.Context, repo_path: str):
+    if ctx.obj.repo(repo_path):
         save_repo_path(repo_path)
         typer.echo(f"Repository loaded successfully from {repo_path}.")
     else:
         typer.echo("Failed to load repository. Please check the path and try again.")
 
 @app.command("query", help="Send a query to the AI Coding Agent.\nExample: python main.py query \"How to add two numbers?\"")
-def query(query_text: str):
+def query(ctx: typer.Context, query_text: str):
     repo_path = load_repo_path()
     if not repo_path:
         typer.echo("Error: Repository not initialized. Run 'init-repo' first.")
         raise typer.Exit(code=1)
-    repo_manager = RepositoryManager(repo_path)
-    if not repo_manager.load_repository():
+    repo_manager = ctx.obj.repo(repo_path)
+    if not repo_manager:
         typer.echo("Error: Unable to load repository from stored path.")
         raise typer.Exit(code=1)
-    code_chunks = repo_manager.get_code_chunks()
+    code_chunks = repo_manager.iter_code_chunks()
+    from prompt_engineering import PromptEngineer
     prompt_engineer = PromptEngineer()
     prompt = prompt_engineer.build_prompt(query_text, code_chunks)
-    llm = LLMIntegration()
+    llm = ctx.obj.llm
     stop_event = threading.Event()
     indicator_thread = threading.Thread(target=thinking_indicator, args=(stop_event,))
     indicator_thread.start()
-    response = llm.send_prompt(prompt)
-    stop_event.set()
-    indicator_thread.join()
-    if response:
-        typer.echo("LLM Response:")
-        typer.echo(response)
+    # The indicator only runs until the first token; after that tokens are printed as they arrive.
+    received = False
+    try:
+        for chunk in llm.send_prompt_stream(prompt):
+            if not received:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                stop_event.set()
+                indicator_thread.join()
+                typer.echo("LLM Response:")
+                received = True
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+    finally:
+        stop_event.set()
+        indicator_thread.join()
+    if received:
+        sys.stdout.write("\n")
     else:
         typer.echo("Failed to get a response from the LLM.")
 
 @app.command("lint", help="Run linting on files.\nExamples:\n  python main.py lint app/app.py\n  python main.py lint -a\n  python main.py lint app/app.py -s\n  python main.py lint app/app.py -a -s\nUse -p flag for full paths.")
 def lint(
+    ctx: typer.Context,
     file_path: str = typer.Argument("", help="Path to file (relative to repo) if not using --full-path"),
     all_files: bool = typer.Option(False, "--all", "-a", help="Lint all eligible files (excluding tests)"),
     suggest: bool = typer.Option(False, "--suggest", "-s", help="Automatically apply lint suggestions"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat file_path as a full path")
 ):
-    tool_integration = ToolIntegration()
+    tool_integration = ctx.obj.tools
     results = []
     if all_files:
         repo_path = load_repo_path()
         if not repo_path:
             typer.echo("Repository not initialized. Run 'init-repo' first.")
             raise typer.Exit(code=1)
-        for root, dirs, files in os.walk(repo_path):
-            if "tests" in root:
-                continue
-            for file in files:
-                if file.endswith(".py"):
-                    fp = os.path.join(root, file)
-                    if suggest:
-                        res = tool_integration.apply_lint_suggestions(fp)
-                    else:
-                        res = tool_integration.run_linter(fp)
-                    results.append(f"{fp}:\n{res}\n")
+        python_files = collect_python_files(repo_path)
+        action = tool_integration.apply_lint_suggestions if suggest else tool_integration.run_linter
+        # Each call is a linter subprocess, so threads overlap them without contending for the GIL.
+        with ThreadPoolExecutor(max_workers=LINT_WORKERS) as executor:
+            for fp, res in zip(python_files, executor.map(action, python_files)):
+                results.append(f"{fp}:\n{res}\n")
     else:
         resolved_path = resolve_path(file_path, full_path)
         if suggest:
@@ -181,71 +439,80 @@ def lint(
         results.append(f"{resolved_path}:\n{res}\n")
     typer.echo("\n".join(results))
 
+def _run_tests_once(repo_path: str, tool_integration) -> str:
+    result = tool_integration.run_tests(repo_path)
+    typer.echo("Test Results:")
+    typer.echo(result)
+    return result
+
+def _handle_test_failures(ctx: typer.Context, repo_path: str, result: str):
+    """Offer an LLM fix for every failing test file named in the pytest output."""
+    failed_files = set(_FAILED_TEST_RE.findall(result))
+    for test_file in failed_files:
+        full_test_file = os.path.join(repo_path, "tests", test_file)
+        if os.path.exists(full_test_file):
+            typer.echo(f"\nExamining failing test file: {full_test_file}")
+            content = read_text_file(full_test_file)
+            typer.echo("Test file content:")
+            typer.echo(content)
+            # Check for syntax errors
+            try:
+                compile(content, full_test_file, 'exec')
+            except SyntaxError as se:
+                typer.echo(f"SyntaxError detected: {se}")
+            choice = typer.confirm("Would you like to attempt an LLM-generated fix for this test file?")
+            if choice:
+                llm = ctx.obj.llm
+                prompt = (
+                    "The following test file is failing and/or has syntax errors. Suggest a fix for any issues (including syntax errors) causing deliberate failures:\n\n"
+                    f"{content}\n\nProvide only the modified file content."
+                )
+                fix = llm.send_prompt(prompt)
+                if fix:
+                    typer.echo("Proposed fix:")
+                    typer.echo(fix)
+                    apply_fix = typer.confirm("Apply this fix to the test file?")
+                    if apply_fix:
+                        with open(full_test_file, 'w', encoding='utf-8') as f:
+                            f.write(fix)
+                        typer.echo("Fix applied.")
+                    else:
+                        typer.echo("Fix not applied.")
+                else:
+                    typer.echo("LLM did not return a fix.")
+
 @app.command("test", help="Run tests using pytest.\nExample: python main.py test\nUse --safety to run safety net checks for failing tests.")
-def run_tests(safety: bool = typer.Option(False, "--safety", help="Run safety net: check failing tests and auto-suggest fixes")):
+def run_tests(ctx: typer.Context, safety: bool = typer.Option(False, "--safety", help="Run safety net: check failing tests and auto-suggest fixes")):
     repo_path = load_repo_path()
     if not repo_path:
         typer.echo("Repository not initialized. Run 'init-repo' first.")
         raise typer.Exit(code=1)
-    tool_integration = ToolIntegration()
-    result = tool_integration.run_tests(repo_path)
-    typer.echo("Test Results:")
-    typer.echo(result)
-    if safety and "FAILED" in result:
-        import re
-        failed_files = set(re.findall(r'(test_[\w_]+\.py)', result))
-        for test_file in failed_files:
-            full_test_file = os.path.join(repo_path, "tests", test_file)
-            if os.path.exists(full_test_file):
-                typer.echo(f"\nExamining failing test file: {full_test_file}")
-                with open(full_test_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                typer.echo("Test file content:")
-                typer.echo(content)
-                # Check for syntax errors
-                try:
-                    compile(content, full_test_file, 'exec')
-                except SyntaxError as se:
-                    typer.echo(f"SyntaxError detected: {se}")
-                choice = typer.confirm("Would you like to attempt an LLM-generated fix for this test file?")
-                if choice:
-                    llm = LLMIntegration()
-                    prompt = (
-                        "The following test file is failing and/or has syntax errors. Suggest a fix for any issues (including syntax errors) causing deliberate failures:\n\n"
-                        f"{content}\n\nProvide only the modified file content."
-                    )
-                    fix = llm.send_prompt(prompt)
-                    if fix:
-                        typer.echo("Proposed fix:")
-                        typer.echo(fix)
-                        apply_fix = typer.confirm("Apply this fix to the test file?")
-                        if apply_fix:
-                            with open(full_test_file, 'w', encoding='utf-8') as f:
-                                f.write(fix)
-                            typer.echo("Fix applied.")
-                        else:
-                            typer.echo("Fix not applied.")
-                    else:
-                        typer.echo("LLM did not return a fix.")
-        rerun = typer.confirm("Would you like to rerun the tests?")
-        if rerun:
-            run_tests(safety=safety)
+    tool_integration = ctx.obj.tools
+    while True:
+        result = _run_tests_once(repo_path, tool_integration)
+        if not safety or "FAILED" not in result:
+            break
+        _handle_test_failures(ctx, repo_path, result)
+        if not typer.confirm("Would you like to rerun the tests?"):
+            break
 
 @app.command("preview", help="Generate a diff preview between two files.\nExample: python main.py preview app/module.py app/module_new.py\nUse -p flag for full paths.")
 def preview(
+    ctx: typer.Context,
     original_file: str = typer.Argument(..., help="Path to original file (relative to repo if -p not used)"),
     new_file: str = typer.Argument(..., help="Path to modified file (relative to repo if -p not used)"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat provided paths as full paths")
 ):
     orig = resolve_path(original_file, full_path)
     new = resolve_path(new_file, full_path)
-    tool_integration = ToolIntegration()
+    tool_integration = ctx.obj.tools
     try:
-        with open(orig, 'r', encoding='utf-8') as f:
-            original = f.read()
-        with open(new, 'r', encoding='utf-8') as f:
-            modified = f.read()
-        diff = tool_integration.generate_diff(original, modified)
+        if files_identical(orig, new):
+            typer.echo("No differences found.")
+            return
+        original = read_text_lines(orig)
+        modified = read_text_lines(new)
+        diff = tool_integration.generate_diff(original, modified, n=3)
         if diff:
             typer.echo("Diff Preview:")
             typer.echo(diff)
@@ -256,25 +523,26 @@ def preview(
 
 @app.command("apply_changes", help="Apply changes to a file after previewing diff and confirmation.\nExample: python main.py apply_changes app/module.py app/module_new.py\nUse -p flag for full paths.")
 def apply_changes(
+    ctx: typer.Context,
     original_file: str = typer.Argument(..., help="Path to original file"),
     new_file: str = typer.Argument(..., help="Path to modified file"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat provided paths as full paths")
 ):
     orig = resolve_path(original_file, full_path)
     new = resolve_path(new_file, full_path)
-    tool_integration = ToolIntegration()
+    tool_integration = ctx.obj.tools
     try:
-        with open(orig, 'r', encoding='utf-8') as f:
-            original = f.read()
-        with open(new, 'r', encoding='utf-8') as f:
-            modified = f.read()
-        diff = tool_integration.generate_diff(original, modified)
+        if files_identical(orig, new):
+            typer.echo("No differences found. Nothing to apply.")
+            return
+        original = read_text_lines(orig)
+        modified = read_text_lines(new)
+        diff = tool_integration.generate_diff(original, modified, n=3)
         typer.echo("Diff Preview:")
         typer.echo(diff)
         confirm = typer.confirm("Do you want to apply these changes?")
         if confirm:
-            with open(orig, 'w', encoding='utf-8') as f:
-                f.write(modified)
+            replace_file_with(new, orig)
             typer.echo("Changes applied successfully.")
         else:
             typer.echo("Operation cancelled. No changes were made.")
@@ -283,35 +551,41 @@ def apply_changes(
 
 @app.command("scan", help="Scan the repository and display extracted code chunks using AST-based chunking.\nExample: python main.py scan app\nUse -p for full path.")
 def scan(
+    ctx: typer.Context,
     repo_path: str = typer.Argument(..., help="Repository path or subfolder (relative if -p not used)"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat repo_path as a full path")
 ):
     resolved_repo = resolve_path(repo_path, full_path)
-    repo_manager = RepositoryManager(resolved_repo)
-    if not repo_manager.load_repository():
+    repo_manager = ctx.obj.repo(resolved_repo)
+    if not repo_manager:
         typer.echo("Failed to load repository.")
         raise typer.Exit(code=1)
-    chunks = repo_manager.get_code_chunks()
     typer.echo("Extracted code chunks:")
-    for chunk in chunks:
-        typer.echo(f"\nFile: {chunk.get('file')}, Modified: {chunk.get('modified')}")
-        if 'name' in chunk:
-            typer.echo(f"Type: {chunk.get('type')}, Name: {chunk.get('name')}")
-        typer.echo("Snippet:")
-        typer.echo(chunk.get("content")[:200])
+    # Chunks are streamed and printed with one write per file rather than four echoes per chunk.
+    for _, file_chunks in itertools.groupby(repo_manager.iter_code_chunks(), key=lambda chunk: chunk.get('file')):
+        lines = []
+        for chunk in file_chunks:
+            lines.append(f"\nFile: {chunk.get('file')}, Modified: {chunk.get('modified')}")
+            if 'name' in chunk:
+                lines.append(f"Type: {chunk.get('type')}, Name: {chunk.get('name')}")
+            lines.append("Snippet:")
+            lines.append(chunk.get("content")[:200])
+        typer.echo("\n".join(lines))
 
 @app.command("retrieve", help="Retrieve and display a prompt built from relevant code chunks.\nExample: python main.py retrieve app \"How to add two numbers?\"\nUse -p flag for full path.")
 def retrieve(
+    ctx: typer.Context,
     repo_path: str = typer.Argument(..., help="Repository path (relative if -p not used)"),
     query: str = typer.Argument(..., help="The query to send to the LLM"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat repo_path as a full path")
 ):
     resolved_repo = resolve_path(repo_path, full_path)
-    repo_manager = RepositoryManager(resolved_repo)
-    if not repo_manager.load_repository():
+    repo_manager = ctx.obj.repo(resolved_repo)
+    if not repo_manager:
         typer.echo("Failed to load repository.")
         raise typer.Exit(code=1)
-    chunks = repo_manager.get_code_chunks()
+    chunks = repo_manager.iter_code_chunks()
+    from prompt_engineering import PromptEngineer
     prompt_engineer = PromptEngineer()
     prompt = prompt_engineer.build_prompt(query, chunks)
     typer.echo("Generated Prompt:")
@@ -322,73 +596,123 @@ def generate_test(
     file: str = typer.Argument(..., help="Source file path (relative if -p not used)"),
     full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat file as a full path")
 ):
-    resolved_file = resolve_path(file, full_path)
     repo_path = load_repo_path()
     if not repo_path:
         typer.echo("Repository not initialized. Run 'init-repo' first.")
         raise typer.Exit(code=1)
+    resolved_file = resolve_path(file, full_path, repo_path)
+    from test_generator import generate_test_file
     generate_test_file(resolved_file, repo_path=repo_path)
     typer.echo("Test file generation attempted.")
 
-@app.command("generate-custom-test", help="Generate a customized test file using the LLM for a Python source file.\nExample: python main.py generate-custom-test app/app.py\nUses repo's tests folder. Use -p for full path.")
+@app.command("generate-custom-test", help="Generate a customized test file using the LLM for one or more Python source files.\nExample: python main.py generate-custom-test app/app.py app/utils.py\nSeveral files are batched into fewer LLM prompts. Uses repo's tests folder. Use -p for full paths.")
 def generate_custom_test(
-    file: str = typer.Argument(..., help="Source file path (relative if -p not used)"),
-    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat file as a full path")
+    ctx: typer.Context,
+    files: List[str] = typer.Argument(..., help="Source file path(s) (relative if -p not used)"),
+    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat files as full paths")
 ):
-    resolved_file = resolve_path(file, full_path)
     repo_path = load_repo_path()
     if not repo_path:
         typer.echo("Repository not initialized. Run 'init-repo' first.")
         raise typer.Exit(code=1)
-    generate_custom_test_file(resolved_file, repo_path=repo_path)
+    resolved_files = [resolve_path(file, full_path, repo_path) for file in files]
+    if len(resolved_files) == 1:
+        from test_generator import generate_custom_test_file
+        generate_custom_test_file(resolved_files[0], repo_path=repo_path, llm=ctx.obj.llm)
+    else:
+        from test_generator import generate_custom_tests_batch
+        generate_custom_tests_batch(resolved_files, repo_path=repo_path, llm=ctx.obj.llm)
     typer.echo("Custom test file generation attempted.")
 
-@app.command("add-plugin", help="Add an external plugin to Refactron by cloning its git repo.\nExample: python main.py add-plugin https://example.com/myplugin.git")
-def add_plugin(plugin_url: str):
-    pattern = r'^(https?://[^\s/$.?#].[^\s]*)\.git$'
-    if not re.match(pattern, plugin_url):
-        typer.echo("Invalid plugin URL. Ensure it starts with http(s):// and ends with .git")
+_plugins_cache = {}
+
+def load_plugins(plugins_json: str) -> list:
+    """Return the registered plugins, reading plugins.json only the first time per process."""
+    if plugins_json not in _plugins_cache:
+        plugins_list = []
+        if os.path.exists(plugins_json):
+            try:
+                with open(plugins_json, "rb") as f:
+                    plugins_list = json_loads(f.read())
+            except Exception as e:
+                typer.echo(f"Error reading plugins.json: {e}")
+        _plugins_cache[plugins_json] = plugins_list
+    return list(_plugins_cache[plugins_json])
+
+def save_plugins(plugins_json: str, plugins_list: list):
+    """Write plugins.json via a temp file and rename, so a crash never leaves it half-written."""
+    write_file_atomic(plugins_json, json_dumps(plugins_list, indent=True))
+    _plugins_cache[plugins_json] = list(plugins_list)
+
+@app.command("add-plugin", help="Add external plugins to Refactron by cloning their git repos.\nExample: python main.py add-plugin https://example.com/myplugin.git https://example.com/other.git")
+def add_plugin(plugin_urls: List[str] = typer.Argument(..., help="One or more plugin git URLs")):
+    invalid_urls = [url for url in plugin_urls if not _PLUGIN_URL_RE.match(url)]
+    if invalid_urls:
+        for url in invalid_urls:
+            typer.echo(f"Invalid plugin URL: {url}. Ensure it starts with http(s):// and ends with .git")
         raise typer.Exit(code=1)
     plugins_dir = os.path.join(os.getcwd(), "plugins")
     os.makedirs(plugins_dir, exist_ok=True)
-    plugin_name = os.path.basename(plugin_url)
-    if plugin_name.endswith(".git"):
-        plugin_name = plugin_name[:-4]
-    target_path = os.path.join(plugins_dir, plugin_name)
-    if os.path.exists(target_path):
-        typer.echo(f"Plugin '{plugin_name}' already exists.")
+    pending = {}
+    for plugin_url in plugin_urls:
+        plugin_name = os.path.basename(plugin_url)
+        if plugin_name.endswith(".git"):
+            plugin_name = plugin_name[:-4]
+        target_path = os.path.join(plugins_dir, plugin_name)
+        if os.path.exists(target_path) or plugin_name in pending:
+            typer.echo(f"Plugin '{plugin_name}' already exists.")
+            continue
+        pending[plugin_name] = (plugin_url, target_path)
+    if not pending:
         raise typer.Exit()
-    try:
-        typer.echo(f"Cloning plugin from {plugin_url} into {target_path}...")
-        subprocess.check_call(["git", "clone", plugin_url, target_path])
-    except subprocess.CalledProcessError as e:
-        typer.echo(f"Error cloning plugin: {e}")
-        raise typer.Exit(code=1)
-    plugins_json = os.path.join(plugins_dir, "plugins.json")
-    plugins_list = []
-    if os.path.exists(plugins_json):
+
+    def clone(plugin_url: str, target_path: str):
+        # Plugins don't need history; stderr is captured so parallel clones don't interleave.
+        subprocess.run(
+            ["git", "clone", "--quiet", "--depth=1", plugin_url, target_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+
+    # Clones are network-bound, so running them side by side scales almost linearly.
+    with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+        futures = {}
+        for plugin_name, (plugin_url, target_path) in pending.items():
+            typer.echo(f"Cloning plugin from {plugin_url} into {target_path}...")
+            futures[plugin_name] = executor.submit(clone, plugin_url, target_path)
+    added = []
+    for plugin_name, future in futures.items():
+        try:
+            future.result()
+        except subprocess.CalledProcessError as e:
+            details = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+            typer.echo(f"Error cloning plugin '{plugin_name}': {details or e}")
+            continue
+        plugin_url, target_path = pending[plugin_name]
+        added.append({"name": plugin_name, "url": plugin_url, "path": target_path})
+    if added:
+        plugins_json = os.path.join(plugins_dir, "plugins.json")
+        plugins_list = load_plugins(plugins_json) + added
         try:
-            with open(plugins_json, "r") as f:
-                plugins_list = json.load(f)
+            save_plugins(plugins_json, plugins_list)
         except Exception as e:
-            typer.echo(f"Error reading plugins.json: {e}")
-    plugins_list.append({"name": plugin_name, "url": plugin_url, "path": target_path})
-    try:
-        with open(plugins_json, "w") as f:
-            json.dump(plugins_list, f, indent=4)
-            print(f"Plugin '{plugin_name}' added to plugins.json.") # remove this line if you don't want to print it
-    except Exception as e:
-        typer.echo(f"Error writing plugins.json: {e}")
+            typer.echo(f"Error writing plugins.json: {e}")
+            raise typer.Exit(code=1)
+        for plugin in added:
+            typer.echo(f"Plugin '{plugin['name']}' added successfully.")
+    if len(added) < len(pending):
         raise typer.Exit(code=1)
-    typer.echo(f"Plugin '{plugin_name}' added successfully.")
 
 @app.command("live-diff", help="Launch a live diff view for a specified file.\nExample: python main.py live-diff app/module.py\nUse -p for full path.")
 def live_diff(
     file_path: str = typer.Argument(..., help="File path for live diff (relative if -p not used)"),
-    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat file_path as a full path")
+    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat file_path as a full path"),
+    poll: bool = typer.Option(False, "--poll", help="Poll for changes instead of native events (NFS/cloud mounts)")
 ):
     resolved_file = resolve_path(file_path, full_path)
-    live_diff_view(resolved_file)
+    from diff_view import live_diff_view
+    live_diff_view(resolved_file, polling=poll)
 
 @app.command("selective-apply", help="Interactively review and apply changes from a modified file to the original file.\nExample: python main.py selective-apply app/module.py app/module_new.py\nUse -p for full paths.")
 def selective_apply_cmd(
@@ -404,19 +728,23 @@ def selective_apply_cmd(
 @app.command("auto-test", help="Watch the repository for changes and automatically run tests.\nExample: python main.py auto-test app\nUse -p for full path.")
 def auto_test(
     repo_path: str = typer.Argument(..., help="Repository path (relative if -p not used)"),
-    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat repo_path as a full path")
+    full_path: bool = typer.Option(False, "--full-path", "-p", help="Treat repo_path as a full path"),
+    poll: bool = typer.Option(False, "--poll", help="Poll for changes instead of native events (NFS/cloud mounts)")
 ):
     resolved_repo = resolve_path(repo_path, full_path)
-    watch_and_run_tests(resolved_repo)
+    from autotest import watch_and_run_tests
+    watch_and_run_tests(resolved_repo, polling=poll)
 
 @app.command("run-sandbox", help="Execute a code snippet in a sandboxed environment.\nExample: python main.py run-sandbox \"print('Hello from sandbox')\"")
 def run_sandbox(code: str):
+    from executor import run_in_sandbox
     output = run_in_sandbox(code)
     typer.echo("Sandboxed Execution Output:")
     typer.echo(output)
 
 @app.command("fix", help="Scan for syntax errors in file(s) and attempt to fix them using the LLM.\nExamples:\n  python main.py fix app/app.py\n  python main.py fix -a\n  python main.py fix app/app.py -s\n  python main.py fix -a -s\nUse -p for full paths.")
 def fix(
+    ctx: typer.Context,
     file: str = typer.Argument("", help="File path (relative if -p not used). Leave empty with -a to process all files."),
     all_files: bool = typer.Option(False, "--all", "-a", help="Process all eligible files (exclude tests folder)"),
     auto_apply: bool = typer.Option(False, "--suggest", "-s", help="Automatically apply fixes without prompting"),
@@ -428,23 +756,36 @@ def fix(
             typer.echo("Repository not initialized. Run 'init-repo' first.")
             raise typer.Exit(code=1)
         fixed_any = False
-        for root, dirs, files in os.walk(repo_path):
-            if "tests" in root:
-                continue
-            for f in files:
-                if f.endswith(".py"):
-                    current_file = os.path.join(root, f)
-                    typer.echo(f"\nProcessing {current_file}...")
-                    if fix_file(current_file, auto_apply):
-                        fixed_any = True
+        broken = []
+        # Progress lines are buffered and written every FIX_ECHO_BATCH files instead of per line.
+        lines = []
+        for count, current_file in enumerate(collect_python_files(repo_path), 1):
+            lines.append(f"\nProcessing {current_file}...")
+            found = find_syntax_error(current_file)
+            if found is None:
+                lines.append(f"No syntax errors in {current_file}.")
+            else:
+                broken.append((current_file, found))
+            if count % FIX_ECHO_BATCH == 0:
+                typer.echo("\n".join(lines))
+                lines = []
+        if lines:
+            typer.echo("\n".join(lines))
+        # Request all fixes concurrently (bounded so the LLM server isn't flooded), then review them one by one.
+        prompts = [build_fix_prompt(content, e) for _, (content, e) in broken]
+        fixes = ctx.obj.llm.send_prompts(prompts, max_concurrency=FIX_CONCURRENCY)
+        for (current_file, (_, e)), proposed in zip(broken, fixes):
+            typer.echo(f"\nSyntax error in {current_file}: {e}")
+            if offer_fix(current_file, proposed, auto_apply):
+                fixed_any = True
         if not fixed_any:
             typer.echo("No syntax errors detected in any files.")
     else:
         if not file:
             typer.echo("Please provide a file path or use --all flag.")
             raise typer.Exit(code=1)
-        resolved_file = resolve_path(file, full_path)
-        if fix_file(resolved_file, auto_apply):
+        resolved_file = resolve_path(file, full_path, repo_path)
+        if fix_file(resolved_file, auto_apply, llm=ctx.obj.llm):
             typer.echo(f"Fixed syntax errors in {resolved_file}.")
         else:
             typer.echo(f"No fixes applied for {resolved_file}.")
@@ -3,19 +3,28 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-from typing import List, Dict
+import functools
+from typing import Dict, Iterable, Tuple
 from retrieval_module import RetrievalModule
 
+@functools.lru_cache(maxsize=32)
+def _code_context_block(chunks: Tuple[Tuple[str, str], ...]) -> str:
+    parts = ["Code Context:\n"]
+    for file, snippet in chunks:
+        parts.append(f"\n--- File: {file} ---\n{snippet}\n")
+    return "".join(parts)
+
 class PromptEngineer:
     def __init__(self):
         self.retrieval = RetrievalModule()
 
-    def build_prompt(self, query: str, code_chunks: List[Dict[str, str]]) -> str:
+    def build_prompt(self, query: str, code_chunks: Iterable[Dict[str, str]]) -> str:
+        """
+        The code context comes first, in a fixed (file, content) order, and the query last,
+        so queries that retrieve the same chunks share a byte-identical prefix the LLM server
+        can reuse from its prompt cache instead of re-processing it.
+        """
         self.retrieval.embed_chunks(code_chunks)
         relevant_chunks = self.retrieval.search(query, top_k=3)
-        prompt = f"User Query: {query}\n\nCode Context:\n"
-        for chunk in relevant_chunks:
-            file = chunk.get("file", "unknown")
-            snippet = chunk.get("content", "")
-            prompt += f"\n--- File: {file} ---\n{snippet}\n"
-        return prompt
+        context = tuple(sorted((chunk.get("file", "unknown"), chunk.get("content", "")) for chunk in relevant_chunks))
+        return "".join([_code_context_block(context), f"\nUser Query: {query}\n"])
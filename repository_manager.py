@@ -5,10 +5,36 @@ Email: chaitanyachadha12@gmail.com
 
 import os
 import time
+import mmap
+import logging
+import multiprocessing
+import pickle
+import sqlite3
 import git
-from typing import List, Dict, Any
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 import ast
 
+_logger = logging.getLogger("refactron.repository")
+
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Below this many Python files, starting worker processes costs more than parsing inline.
+PARSE_PROCESS_MIN_FILES = 64
+# Non-Python files at least this large are chunked from an mmap rather than read into one str.
+MMAP_MIN_BYTES = 1 << 18
+# Larger files (lockfiles, minified bundles, fixtures) are left out of the index without being opened.
+MAX_INDEX_BYTES = 512_000
+# Directory names containing any of these are skipped (so 'venv' also covers '.venv' and 'venv-refactron').
+SKIP_DIR_MARKERS = ('.git', 'venv', '__pycache__', 'node_modules')
+SKIP_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.exe', '.dll', '.so', '.bin', '.pyc', '.pdf', '.zip')
+DEFINITION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+DEFAULT_CHUNK_CACHE_PATH = os.path.expanduser("~/.cache/refactron/chunks.sqlite3")
+# Bump when the chunk format or extraction rules change.
+CHUNK_CACHE_VERSION = 3
+# Lines repeated at the start of each fallback chunk from the end of the previous one.
+CHUNK_OVERLAP_LINES = 5
+
 class RepositoryManager:
     """
     Scans the repository and extracts code context.
@@ -16,9 +42,11 @@ class RepositoryManager:
     For Python files, it extracts function and class definitions as logical chunks.
     """
 
-    def __init__(self, repo_path: str):
+    def __init__(self, repo_path: str, use_cache: bool = True, chunk_cache_path: str = DEFAULT_CHUNK_CACHE_PATH):
         self.repo_path = repo_path
         self.repo = None
+        self.use_cache = use_cache
+        self.chunk_cache_path = chunk_cache_path
 
     def load_repository(self) -> bool:
         try:
@@ -32,95 +60,332 @@ class RepositoryManager:
             return False
 
     def get_all_files(self) -> List[str]:
-        file_paths = []
-        skip_extensions = {'.png', '.jpg', '.jpeg', '.gif', '.exe', '.dll', '.so', '.bin'}
+        return [entry.path for entry in self._get_all_entries()]
+
+    def _get_all_entries(self) -> List[os.DirEntry]:
         try:
-            for root, dirs, files in os.walk(self.repo_path):
-                if any(excluded in root for excluded in ['.git', 'venv', '__pycache__']):
-                    continue
-                for file in files:
-                    if file.startswith('.'):
-                        continue
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in skip_extensions:
-                        continue
-                    file_paths.append(os.path.join(root, file))
-            return file_paths
+            return list(self._iter_file_entries(self.repo_path))
         except Exception as e:
             print(f"Error while scanning repository: {e}")
             return []
 
+    def _iter_file_entries(self, root: str) -> Iterator[os.DirEntry]:
+        """
+        Walk root with os.scandir, using the DirEntry type cache instead of extra stats.
+        Entries are yielded so callers can reuse DirEntry.stat(), which is cached per entry.
+        Excluded directories are pruned without being entered; files come before subdirectories, as with os.walk.
+        """
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            return
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not any(marker in name for marker in SKIP_DIR_MARKERS):
+                    subdirs.append(entry.path)
+                continue
+            if entry.is_dir():
+                # A symlink to a directory: os.walk lists it as a directory and doesn't follow it.
+                continue
+            if name[0] == '.' or name.lower().endswith(SKIP_SUFFIXES):
+                continue
+            yield entry
+        for subdir in subdirs:
+            yield from self._iter_file_entries(subdir)
+
     def read_file(self, file_path: str) -> str:
+        """
+        Read a file in one buffered binary read and decode it once. Files with a NUL byte
+        near the start are treated as binary and skipped (returned as "").
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
+            with open(file_path, 'rb', buffering=1 << 20) as f:
+                data = f.read()
         except Exception as e:
             print(f"Error reading file {file_path}: {e}")
             return ""
+        if b'\x00' in data[:4096]:
+            return ""
+        return _normalize_newlines(data.decode('utf-8', errors='replace'))
+
+    def _iter_file_contents(self, files: List[Tuple[str, os.stat_result]]) -> Iterator[Tuple[str, os.stat_result, str]]:
+        """
+        Yield (path, stat, content) for each file in order, reading ahead on a thread pool.
+        At most a few reads per worker are in flight, so memory stays bounded on large repos.
+        """
+        window = READ_WORKERS * 2
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            pending = deque()
+            for file, st in files:
+                pending.append((file, st, executor.submit(self.read_file, file)))
+                if len(pending) >= window:
+                    file, st, future = pending.popleft()
+                    yield file, st, future.result()
+            while pending:
+                file, st, future = pending.popleft()
+                yield file, st, future.result()
 
     def get_code_chunks(self, max_chunk_size: int = 1000) -> List[Dict[str, Any]]:
         """
-        Get code chunks from the repository.
+        Get code chunks from the repository as a list. See iter_code_chunks.
+        """
+        return list(self.iter_code_chunks(max_chunk_size))
+
+    def iter_code_chunks(self, max_chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield code chunks from the repository, one file at a time, without holding them all in memory.
         For Python files (.py), attempts to parse using the AST module and extract functions and classes.
         For other files or if parsing fails, falls back to basic chunking.
+        Files whose mtime and size match the chunk cache are served from it without being read.
+        Large repositories parse their Python files on a process pool, since ast.parse holds the GIL.
         """
-        chunks = []
-        files = self.get_all_files()
-        for file in files:
-            content = self.read_file(file)
-            if not content:
+        cache = ChunkCache(self.chunk_cache_path) if self.use_cache else None
+        files = []
+        fresh = set()
+        mapped = set()
+        for entry in self._get_all_entries():
+            file = entry.path
+            try:
+                st = entry.stat()
+            except OSError as e:
+                print(f"Error reading file {file}: {e}")
+                continue
+            if st.st_size > MAX_INDEX_BYTES:
+                _logger.debug("Skipping %s: %d bytes exceeds the %d byte index limit", file, st.st_size, MAX_INDEX_BYTES)
                 continue
-            file_size = len(content)
-            modification_time = os.path.getmtime(file)
-            ext = os.path.splitext(file)[1].lower()
-            if ext == ".py":
-                try:
-                    tree = ast.parse(content, filename=file)
-                    for node in ast.walk(tree):
-                        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
-                            if hasattr(node, "lineno") and hasattr(node, "end_lineno"):
-                                start = node.lineno - 1
-                                end = node.end_lineno
-                                lines = content.splitlines()
-                                snippet = "\n".join(lines[start:end])
-                                chunks.append({
-                                    "file": file,
-                                    "type": "function" if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else "class",
-                                    "name": node.name,
-                                    "content": snippet,
-                                    "modified": time.ctime(modification_time)
-                                })
-                except Exception as e:
-                    print(f"Error parsing Python file {file}: {e}")
-                    if file_size <= max_chunk_size:
-                        chunks.append({
-                            "file": file,
-                            "content": content,
-                            "modified": time.ctime(modification_time)
-                        })
-                    else:
-                        for i in range(0, file_size, max_chunk_size):
-                            chunk_content = content[i:i + max_chunk_size]
-                            chunks.append({
-                                "file": file,
-                                "content": chunk_content,
-                                "chunk_index": i // max_chunk_size,
-                                "modified": time.ctime(modification_time)
-                            })
-            else:
-                if file_size <= max_chunk_size:
-                    chunks.append({
+            if cache is not None and cache.is_fresh(file, st, max_chunk_size):
+                fresh.add(file)
+            elif st.st_size >= MMAP_MIN_BYTES and st.st_size > max_chunk_size and not _is_python_file(file):
+                mapped.add(file)
+            files.append((file, st))
+        stale = [(file, st) for file, st in files if file not in fresh and file not in mapped]
+        python_count = sum(1 for file, _ in stale if _is_python_file(file))
+        use_processes = python_count >= PARSE_PROCESS_MIN_FILES and (os.cpu_count() or 1) > 1
+        # Spawn rather than fork: forking copies this process's threads, locks and loaded
+        # models into every worker.
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) if use_processes else None
+        contents = self._iter_file_contents(stale)
+        try:
+            # Entries are (file, st, content, result) in file order; result is a cached
+            # chunk list, a lazy mmap chunk generator, a parse future, or None to chunk inline.
+            pending = deque()
+            window = (os.cpu_count() or 1) * 4
+            for file, st in files:
+                cached = cache.get(file) if file in fresh else None
+                if cached is not None:
+                    pending.append((file, st, None, cached))
+                elif file in mapped:
+                    pending.append((file, st, None, self._iter_mapped_chunks(file, st, max_chunk_size)))
+                else:
+                    content = self.read_file(file) if file in fresh else next(contents)[2]
+                    if not content:
+                        continue
+                    future = None
+                    if executor is not None and _is_python_file(file):
+                        future = executor.submit(_parse_python_chunks, file, content, st.st_mtime)
+                    pending.append((file, st, content, future))
+                if len(pending) >= window:
+                    yield from self._finish_chunks(*pending.popleft(), max_chunk_size, cache)
+            while pending:
+                yield from self._finish_chunks(*pending.popleft(), max_chunk_size, cache)
+        finally:
+            contents.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            if cache is not None:
+                cache.close()
+
+    def _iter_mapped_chunks(self, file: str, st: os.stat_result, max_chunk_size: int) -> Iterator[Dict[str, Any]]:
+        """
+        Chunk a large non-Python file straight from an mmap, decoding one line at a time
+        instead of materializing the whole file as a str. Chunks follow the same line-boundary
+        rules as _plain_chunks. These chunks are not cached.
+        """
+        modified = time.ctime(st.st_mtime)
+        try:
+            with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if b'\x00' in mm[:4096]:
+                    return
+                lines = iter(mm.readline, b'')
+                text_lines = (_normalize_newlines(line.decode('utf-8', errors='replace')) for line in lines)
+                for chunk_index, chunk_content in enumerate(iter_line_chunks(text_lines, max_chunk_size)):
+                    yield {
                         "file": file,
-                        "content": content,
-                        "modified": time.ctime(modification_time)
-                    })
+                        "content": chunk_content,
+                        "chunk_index": chunk_index,
+                        "modified": modified
+                    }
+        except (OSError, ValueError) as e:
+            print(f"Error reading file {file}: {e}")
+
+    def _finish_chunks(self, file: str, st: os.stat_result, content: str, result, max_chunk_size: int, cache) -> List[Dict[str, Any]]:
+        if result is not None and not isinstance(result, Future):
+            return result
+        modification_time = st.st_mtime
+        if not _is_python_file(file):
+            chunks = _plain_chunks(file, content, modification_time, max_chunk_size)
+        else:
+            try:
+                if result is not None:
+                    chunks = result.result()
                 else:
-                    for i in range(0, file_size, max_chunk_size):
-                        chunk_content = content[i:i + max_chunk_size]
-                        chunks.append({
-                            "file": file,
-                            "content": chunk_content,
-                            "chunk_index": i // max_chunk_size,
-                            "modified": time.ctime(modification_time)
-                        })
+                    chunks = _parse_python_chunks(file, content, modification_time)
+            except Exception as e:
+                print(f"Error parsing Python file {file}: {e}")
+                chunks = _plain_chunks(file, content, modification_time, max_chunk_size)
+        if cache is not None:
+            cache.set(file, st, max_chunk_size, chunks)
         return chunks
+
+class ChunkCache:
+    """
+    On-disk path -> chunk list cache backed by sqlite, valid while a file's mtime_ns and size are unchanged.
+    The freshness index is loaded once up front; chunk lists are pickled and loaded only on a hit.
+    Writes are committed together when the cache is closed.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHUNK_CACHE_PATH):
+        self._conn = None
+        self._index = {}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=5)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, max_chunk_size INTEGER, chunks BLOB)"
+            )
+            # Entries written by an older extraction scheme are dropped rather than served.
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != CHUNK_CACHE_VERSION:
+                self._conn.execute("DELETE FROM chunks")
+                self._conn.execute(f"PRAGMA user_version = {CHUNK_CACHE_VERSION}")
+                self._conn.commit()
+            for path_key, mtime_ns, size, max_chunk_size in self._conn.execute("SELECT path, mtime_ns, size, max_chunk_size FROM chunks"):
+                self._index[path_key] = (mtime_ns, size, max_chunk_size)
+        except sqlite3.Error as e:
+            print(f"Warning: chunk cache disabled: {e}")
+            self._conn = None
+
+    def is_fresh(self, file_path: str, st: os.stat_result, max_chunk_size: int) -> bool:
+        return self._index.get(os.path.abspath(file_path)) == (st.st_mtime_ns, st.st_size, max_chunk_size)
+
+    def get(self, file_path: str) -> List[Dict[str, Any]]:
+        row = None
+        if self._conn is not None:
+            try:
+                row = self._conn.execute("SELECT chunks FROM chunks WHERE path = ?", (os.path.abspath(file_path),)).fetchone()
+            except sqlite3.Error:
+                pass
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, file_path: str, st: os.stat_result, max_chunk_size: int, chunks: List[Dict[str, Any]]):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (path, mtime_ns, size, max_chunk_size, chunks) VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(file_path), st.st_mtime_ns, st.st_size, max_chunk_size, pickle.dumps(chunks, pickle.HIGHEST_PROTOCOL))
+            )
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.commit()
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+        self._conn = None
+
+def _is_python_file(path: str) -> bool:
+    # A suffix compare on the lowered path; os.path.splitext would build two strings per call.
+    return path.lower().endswith(".py")
+
+def _parse_python_chunks(file: str, content: str, modification_time: float) -> List[Dict[str, Any]]:
+    """Extract function and class definitions from Python source. Module-level so worker processes can run it."""
+    chunks = []
+    tree = ast.parse(content, filename=file)
+    lines = content.splitlines()
+    # One timestamp string per file, shared by all of its chunks.
+    modified = time.ctime(modification_time)
+    for node in _iter_definitions(tree):
+        if hasattr(node, "lineno") and hasattr(node, "end_lineno"):
+            start = node.lineno - 1
+            end = node.end_lineno
+            snippet = "\n".join(lines[start:end])
+            chunks.append({
+                "file": file,
+                "type": "function" if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) else "class",
+                "name": node.name,
+                "content": snippet,
+                "modified": modified
+            })
+    return chunks
+
+def _iter_definitions(tree: ast.Module) -> Iterator[ast.AST]:
+    """
+    Yield top-level functions and classes, then the methods of each class, in the order ast.walk
+    would reach them. Deeper nesting is not visited, so expression nodes are never touched.
+    """
+    top_level = [node for node in tree.body if isinstance(node, DEFINITION_TYPES)]
+    yield from top_level
+    for node in top_level:
+        if isinstance(node, ast.ClassDef):
+            yield from (child for child in node.body if isinstance(child, DEFINITION_TYPES))
+
+def _plain_chunks(file: str, content: str, modification_time: float, max_chunk_size: int) -> List[Dict[str, Any]]:
+    """Split content into line-aligned chunks of about max_chunk_size characters (one chunk if it is small enough)."""
+    modified = time.ctime(modification_time)
+    if len(content) <= max_chunk_size:
+        return [{
+            "file": file,
+            "content": content,
+            "modified": modified
+        }]
+    chunks = []
+    for chunk_index, chunk_content in enumerate(iter_line_chunks(content.splitlines(keepends=True), max_chunk_size)):
+        chunks.append({
+            "file": file,
+            "content": chunk_content,
+            "chunk_index": chunk_index,
+            "modified": modified
+        })
+    return chunks
+
+def iter_line_chunks(lines: Iterable[str], target_chars: int = 1000, overlap_lines: int = CHUNK_OVERLAP_LINES) -> Iterator[str]:
+    """
+    Group lines (with their line endings) into chunks of at most target_chars, cutting only at
+    line boundaries. Each chunk after the first starts with the last overlap_lines lines of the
+    previous one, so context isn't lost at the cut; lines longer than target_chars are split.
+    """
+    buffer = []
+    size = 0
+    fresh = False
+    for line in lines:
+        pieces = [line[i:i + target_chars] for i in range(0, len(line), target_chars)] or [line]
+        for piece in pieces:
+            if size + len(piece) > target_chars and fresh:
+                yield "".join(buffer)
+                # Always drop at least one line, so every chunk makes progress.
+                keep = min(overlap_lines, len(buffer) - 1)
+                buffer = buffer[len(buffer) - keep:] if keep > 0 else []
+                size = sum(len(kept) for kept in buffer)
+                while buffer and size + len(piece) > target_chars:
+                    size -= len(buffer.pop(0))
+                fresh = False
+            buffer.append(piece)
+            size += len(piece)
+            fresh = True
+    if fresh:
+        yield "".join(buffer)
+
+def split_by_lines(text: str, target_chars: int = 1000, overlap_lines: int = CHUNK_OVERLAP_LINES) -> List[str]:
+    return list(iter_line_chunks(text.splitlines(keepends=True), target_chars, overlap_lines))
+
+def _normalize_newlines(text: str) -> str:
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
@@ -3,27 +3,293 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
-from sentence_transformers import SentenceTransformer
-import faiss
+import os
+import hashlib
+import itertools
 import numpy as np
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except ImportError:
+    ORTModelForFeatureExtraction = None
+
+DEFAULT_EMBEDDING_CACHE_DIR = os.path.expanduser("~/.cache/refactron/embeddings")
+DEFAULT_ONNX_CACHE_DIR = os.path.expanduser("~/.cache/refactron/onnx")
+MAX_CACHED_EMBEDDINGS = 100000
+# Below this many chunks an exact flat scan is already fast and costs nothing to build.
+HNSW_MIN_CHUNKS = 10000
+# embed_chunks pulls and encodes this many chunks at a time from its input.
+EMBED_BATCH_CHUNKS = 256
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _inner_products(embeddings, query):
+        n = embeddings.shape[0]
+        scores = np.empty(n, np.float32)
+        for i in prange(n):
+            score = 0.0
+            for j in range(embeddings.shape[1]):
+                score += embeddings[i, j] * query[j]
+            scores[i] = score
+        return scores
+else:
+    def _inner_products(embeddings, query):
+        return embeddings @ query
+
+class ExactInnerProductIndex:
+    """
+    Stand-in for faiss.IndexFlatIP when FAISS isn't installed, with the same add/reset/search API.
+    Scores come from a Numba kernel when Numba is available, and top-k uses argpartition instead of a full sort.
+    """
+
+    def __init__(self, embedding_dim: int):
+        self.embedding_dim = embedding_dim
+        self.vectors = np.empty((0, embedding_dim), dtype=np.float32)
+
+    @property
+    def ntotal(self) -> int:
+        return len(self.vectors)
+
+    def add(self, embeddings):
+        self.vectors = np.concatenate([self.vectors, np.ascontiguousarray(embeddings, dtype=np.float32)])
+
+    def reset(self):
+        self.vectors = np.empty((0, self.embedding_dim), dtype=np.float32)
+
+    def search(self, queries, top_k: int):
+        # Like FAISS, missing results are padded with index -1.
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+        k = min(top_k, self.ntotal)
+        if k == 0:
+            return scores, indices
+        for row, query in enumerate(np.ascontiguousarray(queries, dtype=np.float32)):
+            row_scores = _inner_products(self.vectors, query)
+            best = np.argpartition(-row_scores, k - 1)[:k]
+            best = best[np.argsort(-row_scores[best])]
+            scores[row, :k] = row_scores[best]
+            indices[row, :k] = best
+        return scores, indices
+
+def _flat_index(embedding_dim: int):
+    return faiss.IndexFlatIP(embedding_dim) if faiss is not None else ExactInnerProductIndex(embedding_dim)
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+class OnnxEncoder:
+    """
+    Sentence-transformers model exported to ONNX and dynamically quantized to int8, run on ONNX Runtime.
+    The export and quantization happen once; later runs load the quantized model from disk without torch.
+    encode() mean-pools and L2-normalizes like SentenceTransformer.encode(normalize_embeddings=True).
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = DEFAULT_ONNX_CACHE_DIR, max_length: int = 256):
+        hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        save_dir = os.path.join(cache_dir, model_name.replace("/", "--") + "-int8")
+        if not os.path.exists(os.path.join(save_dir, "model_quantized.onnx")):
+            model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(save_dir=save_dir, quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False))
+            AutoTokenizer.from_pretrained(hub_name).save_pretrained(save_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(save_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(save_dir, file_name="model_quantized.onnx")
+        self.max_length = max_length
+
+    def encode(self, texts, batch_size: int = 128):
+        # Batching texts of similar length keeps padding, and so wasted compute, to a minimum.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = self.tokenizer([texts[i] for i in batch], padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+            hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            for i, vector in zip(batch, pooled):
+                embeddings[i] = vector
+        return np.array(embeddings, dtype=np.float32)
+
 class RetrievalModule:
-    def __init__(self, embedding_dim: int = 384):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    """
+    Embeds code chunks with MiniLM and searches them by cosine similarity.
+    The encoder is an int8 ONNX Runtime model when optimum is installed, sentence-transformers otherwise.
+    Embeddings are L2-normalized, so an inner-product index ranks by cosine.
+    Vectors are cached on disk by chunk content hash, so only new or changed
+    chunks are sent through the model.
+    """
+
+    def __init__(self, embedding_dim: int = 384, batch_size: int = 128, model_name: str = 'all-MiniLM-L6-v2', cache_dir: str = DEFAULT_EMBEDDING_CACHE_DIR, quantized: bool = True):
+        self.onnx = quantized and ORTModelForFeatureExtraction is not None
+        if self.onnx:
+            self.model = OnnxEncoder(model_name)
+        else:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(model_name)
+            if _cuda_available():
+                # Half precision halves memory traffic on GPU; CPU inference stays float32.
+                self.model.half()
         self.embedding_dim = embedding_dim
-        self.index = faiss.IndexFlatL2(embedding_dim)
+        self.batch_size = batch_size
+        self.index = _flat_index(embedding_dim)
         self.chunk_mapping = []
+        # Half-precision copy of the indexed vectors; FAISS itself needs float32.
+        self.embeddings = np.empty((0, embedding_dim), dtype=np.float16)
+        # Quantized and full-precision vectors differ slightly, so each backend keeps its own cache.
+        cache_name = model_name + ("-onnx-int8" if self.onnx else "")
+        self.cache_dir = os.path.join(cache_dir, cache_name) if cache_dir else None
+        self._vectors = None
+
+    def _encode(self, texts):
+        if self.onnx:
+            return self.model.encode(texts, batch_size=self.batch_size)
+        return self.model.encode(
+            texts,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            batch_size=self.batch_size,
+            show_progress_bar=False
+        ).astype(np.float32, copy=False)
+
+    @staticmethod
+    def _chunk_hash(text: str) -> str:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+    def load(self, path: str):
+        """Load cached vectors from path/embeddings.npz, if present."""
+        self._vectors = {}
+        try:
+            with np.load(os.path.join(path, "embeddings.npz"), allow_pickle=False) as data:
+                hashes = data["hashes"].tolist()
+                vectors = data["vectors"]
+        except (OSError, ValueError, KeyError):
+            return
+        if vectors.ndim == 2 and vectors.shape == (len(hashes), self.embedding_dim):
+            self._vectors = dict(zip(hashes, vectors))
+
+    def save(self, path: str, keep: list = ()):
+        """Write the cached vectors to path, preferring the hashes in keep when trimming to MAX_CACHED_EMBEDDINGS."""
+        hashes = list(dict.fromkeys(list(keep) + list(self._vectors)))[:MAX_CACHED_EMBEDDINGS]
+        vectors = np.empty((len(hashes), self.embedding_dim), dtype=np.float16)
+        for row, h in enumerate(hashes):
+            vectors[row] = self._vectors[h]
+        try:
+            os.makedirs(path, exist_ok=True)
+            # Hashes and vectors share one file that replaces the old one in a single rename,
+            # so an interrupted save can never pair new hashes with old vectors.
+            tmp_path = os.path.join(path, "embeddings.npz.tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(f, hashes=np.array(hashes, dtype="U32"), vectors=vectors)
+            os.replace(tmp_path, os.path.join(path, "embeddings.npz"))
+        except OSError as e:
+            print(f"Warning: could not save embedding cache: {e}")
 
     def embed_chunks(self, code_chunks):
-        texts = [chunk["content"] for chunk in code_chunks]
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
-        self.index.reset()
-        self.index.add(embeddings)
-        self.chunk_mapping = code_chunks
+        """
+        Embed and index code_chunks, which may be any iterable such as RepositoryManager.iter_code_chunks().
+        Chunks are pulled EMBED_BATCH_CHUNKS at a time and each batch is encoded before the next is
+        produced, so only one batch of texts ever waits on the encoder.
+        """
+        if self._vectors is None:
+            if self.cache_dir:
+                self.load(self.cache_dir)
+            else:
+                self._vectors = {}
+        # Identical chunks (license headers, __init__.py stubs, generated code) are encoded and
+        # stored once; idx_map fans each unique vector back out to every chunk that shares it.
+        unique = {}
+        idx_map = []
+        chunk_mapping = []
+        encoded = False
+        chunks = iter(code_chunks)
+        while True:
+            batch = list(itertools.islice(chunks, EMBED_BATCH_CHUNKS))
+            if not batch:
+                break
+            missing = {}
+            for chunk in batch:
+                text = chunk["content"]
+                h = self._chunk_hash(text)
+                if h not in unique:
+                    unique[h] = len(unique)
+                    if h not in self._vectors:
+                        missing[h] = text
+                idx_map.append(unique[h])
+            if missing:
+                for h, vector in zip(missing, self._encode(list(missing.values()))):
+                    self._vectors[h] = vector.astype(np.float16)
+                encoded = True
+            chunk_mapping.extend(batch)
+        hashes = list(unique)
+        if encoded and self.cache_dir:
+            self.save(self.cache_dir, keep=hashes)
+        # Cached and fresh vectors both go through float16, so rankings don't depend on cache state.
+        unique_embeddings = np.empty((len(hashes), self.embedding_dim), dtype=np.float16)
+        for row, h in enumerate(hashes):
+            unique_embeddings[row] = self._vectors[h]
+        self.embeddings = unique_embeddings[np.asarray(idx_map, dtype=np.intp)]
+        hashes = [hashes[i] for i in idx_map]
+        embeddings = self.embeddings.astype(np.float32)
+        self.index = self._build_index(embeddings, hashes)
+        self.chunk_mapping = chunk_mapping
         return embeddings
 
+    def _build_index(self, embeddings, hashes):
+        """
+        Exact inner-product index for small chunk sets; an HNSW graph for large ones.
+        Building the graph costs far more than one flat scan, so it is saved keyed by the
+        ordered chunk hashes and reloaded while the chunk set is unchanged.
+        """
+        if len(hashes) < HNSW_MIN_CHUNKS or faiss is None:
+            index = _flat_index(self.embedding_dim)
+            index.add(embeddings)
+            return index
+        index_path = None
+        if self.cache_dir:
+            set_key = hashlib.blake2b("".join(hashes).encode("ascii"), digest_size=16).hexdigest()
+            index_path = os.path.join(self.cache_dir, f"hnsw-{set_key}.faiss")
+            if os.path.exists(index_path):
+                try:
+                    index = faiss.read_index(index_path)
+                    index.hnsw.efSearch = 64
+                    return index
+                except RuntimeError:
+                    pass
+        index = faiss.IndexHNSWFlat(self.embedding_dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+        index.hnsw.efSearch = 64
+        index.add(embeddings)
+        if index_path:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                for name in os.listdir(self.cache_dir):
+                    if name.startswith("hnsw-") and name.endswith(".faiss"):
+                        os.remove(os.path.join(self.cache_dir, name))
+                faiss.write_index(index, index_path + ".tmp")
+                os.replace(index_path + ".tmp", index_path)
+            except (OSError, RuntimeError) as e:
+                print(f"Warning: could not save search index: {e}")
+        return index
+
     def search(self, query: str, top_k: int = 3):
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
-        distances, indices = self.index.search(query_embedding, top_k)
-        results = [self.chunk_mapping[idx] for idx in indices[0] if idx < len(self.chunk_mapping)]
+        query_embedding = self._encode([query])
+        scores, indices = self.index.search(query_embedding, top_k)
+        results = [self.chunk_mapping[idx] for idx in indices[0] if 0 <= idx < len(self.chunk_mapping)]
         return results
@@ -4,9 +4,15 @@ Email: chaitanyachadha12@gmail.com
 """
 
 import os
+import re
 import ast
+from typing import List
 from llm_integration import LLMIntegration
 
+_FILE_MARKER_RE = re.compile(r"^\[FILE (\d+)\][^\n]*$", re.MULTILINE)
+# Reasoning models (deepseek-r1) think out loud first and may echo the markers there; an unclosed block runs to the end.
+_THINK_RE = re.compile(r"<think>.*?(?:</think>|\Z)", re.DOTALL)
+
 def get_functions_from_file(file_path: str):
     with open(file_path, "r", encoding="utf-8") as f:
         tree = ast.parse(f.read(), filename=file_path)
@@ -38,7 +44,15 @@ def generate_test_file(source_file: str, repo_path: str = None):
         f.write("    unittest.main()\n")
     print(f"Test file generated: {test_file_path}")
 
-def generate_custom_test_file(source_file: str, repo_path: str = None) -> None:
+def _custom_test_path(source_file: str, repo_path: str = None) -> str:
+    base_name = os.path.basename(source_file)
+    module_name, _ = os.path.splitext(base_name)
+    test_file_name = f"test_{module_name}_custom.py"
+    test_dir = os.path.join(repo_path, "tests") if repo_path else "tests"
+    os.makedirs(test_dir, exist_ok=True)
+    return os.path.join(test_dir, test_file_name)
+
+def generate_custom_test_file(source_file: str, repo_path: str = None, llm: LLMIntegration = None) -> None:
     with open(source_file, "r", encoding="utf-8") as f:
         source_code = f.read()
     prompt = (
@@ -46,17 +60,57 @@ def generate_custom_test_file(source_file: str, repo_path: str = None) -> None:
         f"{source_code}\n\n"
         "Provide complete test file code as output."
     )
-    llm = LLMIntegration()
+    llm = llm or LLMIntegration()
     response = llm.send_prompt(prompt)
     if not response:
         print("LLM failed to generate test file content.")
         return
-    base_name = os.path.basename(source_file)
-    module_name, _ = os.path.splitext(base_name)
-    test_file_name = f"test_{module_name}_custom.py"
-    test_dir = os.path.join(repo_path, "tests") if repo_path else "tests"
-    os.makedirs(test_dir, exist_ok=True)
-    test_file_path = os.path.join(test_dir, test_file_name)
+    test_file_path = _custom_test_path(source_file, repo_path)
     with open(test_file_path, "w", encoding="utf-8") as f:
         f.write(response)
     print(f"Custom test file generated: {test_file_path}")
+
+def generate_custom_tests_batch(source_files: List[str], repo_path: str = None, batch_size: int = 2, llm: LLMIntegration = None) -> None:
+    """
+    Generate custom test files for several sources with one LLM prompt per batch_size files.
+    Each source is tagged with a [FILE i] marker and the reply is split on the same markers;
+    batches are sent concurrently over one client, each with the output budget of batch_size single prompts.
+    A reply cut off at that budget loses its last section rather than writing a truncated test file.
+    """
+    sources = []
+    for source_file in source_files:
+        with open(source_file, "r", encoding="utf-8") as f:
+            sources.append((source_file, f.read()))
+    batches = [sources[i:i + batch_size] for i in range(0, len(sources), batch_size)]
+    prompts = []
+    for batch in batches:
+        parts = [
+            "Generate comprehensive unit tests for each of the following Python files. "
+            "Return one complete test file per input, each prefixed with its [FILE i] marker "
+            "on a line of its own, and nothing outside those sections.\n"
+        ]
+        for i, (_, source_code) in enumerate(batch):
+            parts.append(f"[FILE {i}]\n{source_code}\n")
+        prompts.append("".join(parts))
+    llm = llm or LLMIntegration()
+    statuses = [{} for _ in prompts]
+    responses = llm.send_prompts(prompts, max_output_tokens=llm.max_output_tokens * batch_size, statuses=statuses)
+    for batch, response, status in zip(batches, responses, statuses):
+        sections = _FILE_MARKER_RE.split(_THINK_RE.sub("", response or ""))
+        # split() alternates text and captured indices: [preamble, "0", body0, "1", body1, ...]
+        pairs = list(zip(sections[1::2], sections[2::2]))
+        if status.get("done_reason") == "length":
+            pairs = pairs[:-1]
+        tests = {}
+        for index, body in pairs:
+            # A marker repeated in the preamble or prose loses to its last, real section.
+            if body.strip():
+                tests[int(index)] = body.strip() + "\n"
+        for i, (source_file, _) in enumerate(batch):
+            if i not in tests:
+                print(f"LLM failed to generate test file content for {source_file}.")
+                continue
+            test_file_path = _custom_test_path(source_file, repo_path)
+            with open(test_file_path, "w", encoding="utf-8") as f:
+                f.write(tests[i])
+            print(f"Custom test file generated: {test_file_path}")
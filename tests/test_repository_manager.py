@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repository_manager import RepositoryManager
+
+
+def test_symlinked_directory_is_not_yielded_or_followed(tmp_path, capsys):
+    (tmp_path / "app.py").write_text("def f():\n    return 1\n")
+    target = tmp_path / "pkg"
+    target.mkdir()
+    (target / "mod.py").write_text("x = 1\n")
+    os.symlink(target, tmp_path / "linked_pkg", target_is_directory=True)
+    os.symlink(tmp_path / "app.py", tmp_path / "app_link.py")
+
+    manager = RepositoryManager(str(tmp_path), use_cache=False)
+    files = sorted(os.path.relpath(path, tmp_path) for path in manager.get_all_files())
+
+    assert files == ["app.py", "app_link.py", os.path.join("pkg", "mod.py")]
+    chunks = list(manager.iter_code_chunks())
+    assert chunks
+    assert "Error reading file" not in capsys.readouterr().out
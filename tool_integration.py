@@ -3,45 +3,341 @@ Author: Chaitanya Chadha
 Email: chaitanyachadha12@gmail.com
 """
 
+import io
 import subprocess
 import os
-import difflib
+import sys
+import json
+import atexit
+import shutil
+import hashlib
+import functools
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import List
 
-class ToolIntegration:
-    def __init__(self):
+try:
+    from difflib_rs import unified_diff
+except ImportError:
+    from difflib import unified_diff
+
+# Patience diff groups hunks differently from difflib, so it is opt-in.
+if os.environ.get("PATIENCE_DIFF") == "1":
+    try:
+        from patiencediff import unified_diff
+    except ImportError:
         pass
 
+# Runs inside each lint worker: imports flake8 once, then answers one JSON {"cwd", "options", "paths"} request per stdin line.
+# Each request runs from the caller's cwd, as the CLI would. Style guides come from flake8's legacy API and are
+# kept per (cwd, options), since config discovery depends on the cwd, so options are parsed and plugins loaded once.
+_FLAKE8_WORKER = r"""
+import io, os, sys, json
+from flake8.api import legacy
+from flake8.formatting.default import Default
+from flake8.main.application import Application
+
+class Collector(Default):
+    def _write(self, output):
+        self.lines.append(output)
+
+guides = {}
+out = sys.stdout
+out.write("ready\n")
+out.flush()
+for line in sys.stdin:
+    request = json.loads(line)
+    buf = io.BytesIO()
+    capture = io.TextIOWrapper(buf, encoding="utf-8", write_through=True)
+    sys.stdout = sys.stderr = capture
+    lines = []
+    try:
+        os.chdir(request["cwd"])
+        key = (request["cwd"], tuple(request["options"]))
+        if key not in guides:
+            app = Application()
+            app.initialize(request["options"])
+            guides[key] = app, legacy.StyleGuide(app)
+            guides[key][1].init_report(Collector)
+        app, guide = guides[key]
+        app.formatter.lines = lines
+        app.catastrophic_failure = False
+        guide.check_files(request["paths"])
+        code = app.exit_code()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}")
+        code = 1
+    finally:
+        sys.stdout, sys.stderr = out, sys.__stderr__
+    output = "".join(text + "\n" for text in lines) + buf.getvalue().decode("utf-8", "replace")
+    out.write(json.dumps({"code": code, "output": output}) + "\n")
+    out.flush()
+"""
+
+class Flake8WorkerPool:
+    """
+    Long-lived interpreters with flake8 already imported, so a lint doesn't pay for Python startup
+    and flake8's imports. Each worker handles one request at a time and goes back to the idle list
+    afterwards; a new one is started only when every worker is busy, so concurrent callers each get their own.
+    run() returns None when workers can't be used (e.g. flake8 isn't importable), and callers fall back to the CLI.
+    """
+
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+        self._disabled = False
+        atexit.register(self.close)
+
+    def _checkout(self):
+        with self._lock:
+            if self._disabled:
+                return None
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.poll() is None:
+                    return worker
+        try:
+            worker = subprocess.Popen(
+                [sys.executable, "-c", _FLAKE8_WORKER],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True
+            )
+        except OSError:
+            worker = None
+        if worker is None or worker.stdout.readline() != "ready\n":
+            if worker is not None:
+                worker.kill()
+                worker.wait()
+            with self._lock:
+                self._disabled = True
+            return None
+        return worker
+
+    def run(self, options, paths, timeout: float):
+        worker = self._checkout()
+        if worker is None:
+            return None
+        timed_out = threading.Event()
+        def expire():
+            timed_out.set()
+            worker.kill()
+        timer = threading.Timer(timeout, expire)
+        timer.start()
+        try:
+            worker.stdin.write(json.dumps({"cwd": os.getcwd(), "options": options, "paths": paths}) + "\n")
+            worker.stdin.flush()
+            line = worker.stdout.readline()
+        except OSError:
+            line = ""
+        finally:
+            timer.cancel()
+        if not line:
+            worker.kill()
+            worker.wait()
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(["flake8"] + options + paths, timeout)
+            return None
+        with self._lock:
+            self._idle.append(worker)
+        reply = json.loads(line)
+        return reply["code"], reply["output"]
+
+    def close(self):
+        with self._lock:
+            self._disabled = True
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            # Closing stdin ends the worker's request loop.
+            worker.stdin.close()
+            try:
+                worker.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+                worker.wait()
+
+_flake8_pool = None
+_flake8_pool_lock = threading.Lock()
+
+def get_flake8_pool() -> Flake8WorkerPool:
+    """Return the process-wide lint worker pool, creating it on first use."""
+    global _flake8_pool
+    with _flake8_pool_lock:
+        if _flake8_pool is None:
+            _flake8_pool = Flake8WorkerPool()
+        return _flake8_pool
+
+def _decode_output(completed: subprocess.CompletedProcess, separator: str = "") -> str:
+    """
+    Join a finished process's captured stdout and stderr and decode them once, as UTF-8 with
+    replacement, instead of having subprocess decode each stream with the locale codec.
+    """
+    return (completed.stdout + separator.encode() + completed.stderr).decode("utf-8", "replace")
+
+@functools.lru_cache(maxsize=1)
+def _ruff_path():
+    return shutil.which("ruff")
+
+# Every casing of ".py", so the check is one endswith without lowering a copy of the path.
+_PY_SUFFIXES = ('.py', '.Py', '.pY', '.PY')
+DIFF_CACHE_SIZE = 256
+# (original digest, modified digest, context lines) -> diff text, least recently used first.
+_diff_cache = OrderedDict()
+_diff_cache_lock = threading.Lock()
+
+def _diff_key(text) -> bytes:
+    """Content digest of a diff input; line lists are length-prefixed so different splits of the same text don't collide."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(text, str):
+        digest.update(b"s")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+    else:
+        for line in text:
+            digest.update(b"%d:" % len(line))
+            digest.update(line.encode("utf-8", "surrogatepass"))
+    return digest.digest()
+
+_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+# pytest.main mutates process-wide state (cwd, sys.path, sys.modules, stdout), so only one run at a time.
+_pytest_lock = threading.Lock()
+
+def _run_pytest_in_process(test_directory: str, args):
+    """
+    Run pytest.main(args) in test_directory and return (exit code, output), or None if pytest isn't importable.
+    Modules imported from test_directory during the run are dropped afterwards, so the next run
+    imports the code under test fresh instead of reusing what was cached in sys.modules. Refactron's
+    own modules are hidden for the run, so a project's main.py or watcher.py isn't shadowed by ours.
+    """
+    try:
+        import pytest
+    except ImportError:
+        return None
+    root = os.path.join(os.path.abspath(test_directory), "")
+    own = os.path.join(_SOURCE_DIR, "")
+    output = io.StringIO()
+    with _pytest_lock:
+        cwd = os.getcwd()
+        saved_path = sys.path[:]
+        hidden = {}
+        if not own.startswith(root):
+            hidden = {name: module for name, module in sys.modules.items()
+                      if (getattr(module, "__file__", None) or "").startswith(own)}
+            # A pytest subprocess wouldn't see our directory or the caller's cwd on sys.path either.
+            sys.path[:] = [entry for entry in saved_path if entry not in ("", ".") and os.path.abspath(entry) != _SOURCE_DIR]
+        for name in hidden:
+            del sys.modules[name]
+        before = set(sys.modules)
+        try:
+            os.chdir(test_directory)
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                code = pytest.main(list(args))
+        finally:
+            os.chdir(cwd)
+            sys.path[:] = saved_path
+            for name in set(sys.modules) - before:
+                if name in hidden or (getattr(sys.modules[name], "__file__", None) or "").startswith(root):
+                    del sys.modules[name]
+            sys.modules.update(hidden)
+    return int(code), output.getvalue()
+
+class ToolIntegration:
+    LINT_CACHE_SIZE = 1024
+    # (cwd, path, mtime_ns, size, flake8 args) -> lint report, least recently used first; shared by all instances.
+    _lint_cache = OrderedDict()
+    _lint_cache_lock = threading.Lock()
+
+    # One file never benefits from flake8's process pool; -j 1 keeps older flake8 from starting one anyway.
+    DEFAULT_FLAKE8_ARGS = ["-j", "1"]
+
+    def __init__(self, flake8_args: List[str] = None):
+        # Options go through the warm lint workers, which parse each distinct list once.
+        # ruff can't take flake8 options, so custom ones make run_linter use flake8 even when ruff is installed.
+        self.flake8_args = list(flake8_args) if flake8_args is not None else list(self.DEFAULT_FLAKE8_ARGS)
+
     def run_linter(self, file_path: str) -> str:
-        if not file_path.lower().endswith('.py'):
+        """
+        Lint one Python file with ruff, or with flake8 when ruff isn't on PATH or custom flake8_args are set.
+        Reports are cached until the file's mtime or size changes.
+        """
+        if not file_path.endswith(_PY_SUFFIXES):
             return f"Skipping linting: {os.path.basename(file_path)} is not a Python file."
         try:
-            result = subprocess.run(
-                ["flake8", file_path],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode != 0:
-                return result.stdout + result.stderr
-            return "No linting issues found."
+            st = os.stat(file_path)
+            key = (os.getcwd(), file_path, st.st_mtime_ns, st.st_size, tuple(self.flake8_args))
+        except OSError:
+            key = None
+        if key is not None:
+            with self._lint_cache_lock:
+                if key in self._lint_cache:
+                    self._lint_cache.move_to_end(key)
+                    return self._lint_cache[key]
+        ruff = _ruff_path() if self.flake8_args == self.DEFAULT_FLAKE8_ARGS else None
+        options = self.flake8_args
+        try:
+            result = None
+            if ruff is not None:
+                # E, W and F are the pycodestyle and pyflakes rules flake8 checks by default.
+                command = [ruff, "check", "--output-format", "concise", "--quiet", "--select", "E,W,F", file_path]
+            else:
+                command = ["flake8"] + options + [file_path]
+                result = get_flake8_pool().run(options, [file_path], timeout=10)
+            if result is None:
+                completed = subprocess.run(
+                    command,
+                    capture_output=True,
+                    timeout=10
+                )
+                result = completed.returncode, _decode_output(completed)
+            returncode, output = result
+            report = output if returncode != 0 else "No linting issues found."
         except subprocess.TimeoutExpired:
             return "Linter execution timed out."
         except FileNotFoundError:
-            return "Linter tool not found. Please install flake8."
+            return "Linter tool not found. Please install ruff or flake8."
         except Exception as e:
             return f"Error running linter: {e}"
+        if key is not None:
+            with self._lint_cache_lock:
+                self._lint_cache[key] = report
+                if len(self._lint_cache) > self.LINT_CACHE_SIZE:
+                    self._lint_cache.popitem(last=False)
+        return report
+
+    async def run_linter_async(self, file_path: str) -> str:
+        """Awaitable run_linter. The lint runs on the loop's default executor, so concurrent calls overlap."""
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(None, self.run_linter, file_path)
 
-    def run_tests(self, test_directory: str) -> str:
+    async def lint_many(self, paths) -> List[str]:
+        """Lint paths concurrently and return the reports in input order, e.g. asyncio.run(tools.lint_many(paths))."""
+        import asyncio
+        return list(await asyncio.gather(*(self.run_linter_async(path) for path in paths)))
+
+    def run_tests(self, test_directory: str, isolated: bool = True) -> str:
+        """
+        Run pytest in test_directory. By default it runs in a subprocess with a 30 second timeout, so a
+        hanging, crashing or os._exit-ing suite can't take Refactron down with it. isolated=False runs
+        pytest.main inside this process instead, which skips interpreter startup but has no timeout;
+        use it only for trusted suites run repeatedly from a long-lived caller.
+        """
+        args = ["--maxfail=1", "--disable-warnings", "-q"]
         try:
-            result = subprocess.run(
-                ["pytest", "--maxfail=1", "--disable-warnings", "-q"],
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=test_directory
-            )
-            if result.returncode != 0:
-                return result.stdout + result.stderr
+            result = None if isolated else _run_pytest_in_process(test_directory, args)
+            if result is None:
+                completed = subprocess.run(
+                    ["pytest"] + args,
+                    capture_output=True,
+                    timeout=30,
+                    cwd=test_directory
+                )
+                result = completed.returncode, _decode_output(completed)
+            returncode, output = result
+            if returncode != 0:
+                return output
             return "All tests passed successfully."
         except subprocess.TimeoutExpired:
             return "Test execution timed out."
@@ -50,25 +346,47 @@ class ToolIntegration:
         except Exception as e:
             return f"Error running tests: {e}"
 
-    def generate_diff(self, original: str, modified: str) -> str:
-        diff = difflib.unified_diff(
-            original.splitlines(keepends=True),
-            modified.splitlines(keepends=True),
+    def generate_diff(self, original, modified, n: int = 1) -> str:
+        """
+        Diff two texts; each may be a string or an already-split list of lines.
+        n is the number of context lines around each hunk. The default of 1 suits diffs read by tools;
+        output meant for people should pass n=3, the usual unified diff context.
+        Results are kept in a small LRU keyed by content digest, so re-diffing the same pair is a lookup.
+        """
+        # unified_diff yields nothing for equal inputs; comparing is a memcmp, cheaper than hashing both.
+        if original is modified or original == modified:
+            return ""
+        key = (_diff_key(original), _diff_key(modified), n)
+        with _diff_cache_lock:
+            if key in _diff_cache:
+                _diff_cache.move_to_end(key)
+                return _diff_cache[key]
+        if isinstance(original, str):
+            original = original.splitlines(keepends=True)
+        if isinstance(modified, str):
+            modified = modified.splitlines(keepends=True)
+        diff = ''.join(unified_diff(
+            original,
+            modified,
             fromfile="Original",
-            tofile="Modified"
-        )
-        return ''.join(diff)
+            tofile="Modified",
+            n=n
+        ))
+        with _diff_cache_lock:
+            _diff_cache[key] = diff
+            if len(_diff_cache) > DIFF_CACHE_SIZE:
+                _diff_cache.popitem(last=False)
+        return diff
 
     def apply_lint_suggestions(self, file_path: str) -> str:
         try:
             result = subprocess.run(
                 ["autopep8", "--in-place", file_path],
                 capture_output=True,
-                text=True,
                 timeout=10
             )
             if result.returncode != 0:
-                return f"Error applying lint suggestions: {result.stdout} {result.stderr}"
+                return f"Error applying lint suggestions: {_decode_output(result, ' ')}"
             return "Lint suggestions applied successfully."
         except subprocess.TimeoutExpired:
             return "Auto-fix execution timed out."
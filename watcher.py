@@ -0,0 +1,98 @@
+"""
+Author: Chaitanya Chadha
+Email: chaitanyachadha12@gmail.com
+"""
+
+import os
+import re
+import sys
+import queue
+import signal
+import fnmatch
+import logging
+import threading
+from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
+
+IGNORE_PATTERNS = [
+    "*/.git/*",
+    "*/node_modules/*",
+    "*/__pycache__/*",
+    "*/.pytest_cache/*",
+    "*.swp",
+    "*.swx",
+    "*~",
+]
+
+def compile_patterns(patterns) -> re.Pattern:
+    """Fold glob patterns into one alternation so each event is checked with a single regex search."""
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+# fnmatch's '*' also matches '/', so "*/.git/*" covers files at any depth below .git.
+IGNORE_RE = compile_patterns(IGNORE_PATTERNS)
+
+def is_ignored(path: str) -> bool:
+    if os.sep != '/':
+        path = path.replace(os.sep, '/')
+    return IGNORE_RE.search(path) is not None
+
+_logger = logging.getLogger("refactron.watch")
+_log_queue = queue.Queue(maxsize=1024)
+_drain_thread = None
+_drain_lock = threading.Lock()
+
+def _drain_log_queue():
+    while True:
+        message = _log_queue.get()
+        try:
+            _logger.info(message)
+        finally:
+            _log_queue.task_done()
+
+def emit(message: str):
+    """
+    Hand a message to the background writer instead of printing on the observer thread,
+    so slow terminal writes never hold up event dispatch.
+    """
+    global _drain_thread
+    if _drain_thread is None:
+        with _drain_lock:
+            if _drain_thread is None:
+                handler = logging.StreamHandler(sys.stdout)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                _logger.addHandler(handler)
+                _logger.setLevel(logging.INFO)
+                _logger.propagate = False
+                _drain_thread = threading.Thread(target=_drain_log_queue, daemon=True)
+                _drain_thread.start()
+    try:
+        _log_queue.put_nowait(message)
+    except queue.Full:
+        # Apply backpressure rather than silently dropping output.
+        _log_queue.put(message)
+
+def create_observer(polling: bool = False, poll_interval: float = 1):
+    """
+    Return the platform's native observer, or a PollingObserver when
+    polling is requested (NFS/cloud mounts where native events are
+    unreliable or expensive).
+    """
+    if polling:
+        return PollingObserver(timeout=poll_interval)
+    return Observer()
+
+def run_until_interrupted(observer):
+    """
+    Block the calling thread until Ctrl+C, then stop and join the observer.
+    Waiting on an Event parks the thread instead of waking it every second.
+    """
+    stop = threading.Event()
+    previous_handler = signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        stop.wait()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        observer.stop()
+        observer.join()
+        if _drain_thread is not None:
+            _log_queue.join()